@@ -0,0 +1,87 @@
+import os
+import threading
+
+
+def normalize_address(address):
+    # Checksummed and lowercase forms of an address compare equal.
+    return address.strip().lower()
+
+
+class AddressBook:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = []
+        self._addresses = {}
+        self._aliases = {}
+
+    def _load(self):
+        entries = []
+        with open(self.path, 'r') as f:
+            for line in f.readlines():
+                try:
+                    alias, address = line.split(',')
+                    entries.append((alias, address.strip()))
+                except ValueError:
+                    continue
+        addresses, aliases = {}, {}
+        for alias, address in entries:
+            addresses.setdefault(alias, address)
+            aliases.setdefault(normalize_address(address), alias)
+        return entries, addresses, aliases
+
+    # Reloads only when the file's mtime or size moves, so repeated lookups
+    # cost a stat instead of a scan.
+    def refresh(self):
+        stat = os.stat(self.path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._entries, self._addresses, self._aliases = self._load()
+                self._version = version
+
+    def __len__(self):
+        self.refresh()
+        return len(self._entries)
+
+    def __contains__(self, address):
+        self.refresh()
+        return normalize_address(address) in self._aliases
+
+    def items(self):
+        self.refresh()
+        return list(self._entries)
+
+    def get_address(self, alias):
+        self.refresh()
+        return self._addresses.get(alias)
+
+    def get_alias(self, address, default=None):
+        self.refresh()
+        return self._aliases.get(normalize_address(address), default)
+
+    def label(self, addresses):
+        self.refresh()
+        aliases = self._aliases
+        labels = {}
+        for address in addresses:
+            alias = aliases.get(address.lower())
+            if alias is not None:
+                labels[address] = alias
+        return labels
+
+
+address_books = {}
+address_books_lock = threading.Lock()
+
+
+def get_address_book(path):
+    key = os.path.abspath(path)
+    with address_books_lock:
+        book = address_books.get(key)
+        if book is None:
+            book = address_books[key] = AddressBook(path)
+    return book
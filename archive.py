@@ -0,0 +1,114 @@
+import os
+import json
+
+import numpy as np
+
+from columns import TransferColumns
+
+
+# pyarrow is only needed to save or load archives, so it is imported on use.
+def get_pyarrow():
+    import pyarrow
+    import pyarrow.ipc
+    return pyarrow
+
+
+def is_parquet(path):
+    return os.path.splitext(path)[1] in ['.parquet', '.pq']
+
+
+def get_dictionary_array(pa, ids, values):
+    return pa.DictionaryArray.from_arrays(pa.array(ids.astype(np.int32, copy=False)), pa.array(values, pa.string()))
+
+
+def to_table(columns, metadata=None):
+    pa = get_pyarrow()
+    metadata = dict(metadata or {}, address=columns.address,
+        token_offsets=[int(offset) for offset in columns._token_offsets])
+    return pa.table({
+        'timestamp': pa.array(columns.timestamps, pa.int64()),
+        'block': pa.array(columns.blocks, pa.int64()),
+        'token': get_dictionary_array(pa, columns.token_ids, columns.tokens),
+        'value': pa.array(columns.values, pa.float64()),
+        'hash': get_dictionary_array(pa, columns.hash_ids, columns.hashes),
+        'counterparty': get_dictionary_array(pa, columns.counterparty_ids, columns.counterparties),
+        # Stored as bytes rather than Arrow's bit-packed booleans so it maps
+        # straight onto a NumPy bool view.
+        'outgoing': pa.array(columns.outgoing.astype(np.uint8), pa.uint8()),
+        'token_order': pa.array(columns._token_order, pa.int64()),
+    }, metadata={'cspan': json.dumps(metadata)})
+
+
+def save_columns(columns, path, metadata=None):
+    pa = get_pyarrow()
+    table = to_table(columns, metadata)
+    tmp = f"{path}.tmp"
+    if is_parquet(path):
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(table, tmp)
+    else:
+        # A single record batch keeps every column in one contiguous buffer,
+        # which is what lets load_columns hand out zero-copy views.
+        with pa.OSFile(tmp, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=max(len(columns), 1))
+    os.replace(tmp, path)
+
+
+def get_numpy(column):
+    if column.num_chunks == 1:
+        return column.chunk(0).to_numpy(zero_copy_only=True)
+    return column.combine_chunks().to_numpy(zero_copy_only=True)
+
+
+class DictionaryValues:
+    # Hashes and addresses are looked up one at a time, so they stay in the
+    # Arrow buffer instead of being turned into millions of Python strings.
+    def __init__(self, array):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        return self.array[int(index)].as_py()
+
+    def __iter__(self):
+        return iter(self.array.to_pylist())
+
+
+def get_dictionary_numpy(column, lazy=False):
+    # Chunks share one dictionary once the table has been unified.
+    if not column.num_chunks:
+        return np.empty(0, dtype=np.int32), []
+    dictionary = column.chunk(0).dictionary
+    dictionary = DictionaryValues(dictionary) if lazy else dictionary.to_pylist()
+    indices = [chunk.indices.to_numpy(zero_copy_only=True) for chunk in column.chunks]
+    return (indices[0] if len(indices) == 1 else np.concatenate(indices)), dictionary
+
+
+def read_table(path, memory_map=True):
+    pa = get_pyarrow()
+    if is_parquet(path):
+        import pyarrow.parquet
+        return pyarrow.parquet.read_table(path, memory_map=memory_map)
+    source = pa.memory_map(path) if memory_map else pa.OSFile(path)
+    return pa.ipc.open_file(source).read_all()
+
+
+# Arrow IPC files are memory-mapped, so the numeric columns are views over the
+# file and pages are shared between processes that open the same archive.
+# Parquet has to be decoded and is read into memory.
+def load_columns(path, memory_map=True):
+    table = read_table(path, memory_map).unify_dictionaries()
+    metadata = json.loads((table.schema.metadata or {}).get(b'cspan', b'{}'))
+    token_ids, tokens = get_dictionary_numpy(table.column('token'))
+    hash_ids, hashes = get_dictionary_numpy(table.column('hash'), lazy=True)
+    counterparty_ids, counterparties = get_dictionary_numpy(table.column('counterparty'), lazy=True)
+    names = table.schema.names
+    outgoing = get_numpy(table.column('outgoing')).view(bool) if 'outgoing' in names else None
+    token_order = get_numpy(table.column('token_order')) if 'token_order' in names else None
+    columns = TransferColumns(metadata.get('address'), get_numpy(table.column('timestamp')),
+        get_numpy(table.column('block')), token_ids, get_numpy(table.column('value')), hash_ids,
+        counterparty_ids, tokens, hashes, counterparties, outgoing, token_order, metadata.get('token_offsets'))
+    return columns, metadata
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import trade
+from columns import TransferColumns
+from options import TransactionRangeOptions, get_timestamp_for_range
+from transactions import TransactionRange, get_alias_addresses, get_addresses_transactions
+
+
+def get_token_analytics(transaction_range, token, volume, report):
+    analytics = dict(volume=volume)
+    analytics.update(report.to_dict())
+    try:
+        analytics['variance'] = transaction_range.get_variance(token)
+        analytics['skew'] = transaction_range.get_skew(token)
+    except ZeroDivisionError:
+        analytics['variance'] = analytics['skew'] = None
+    return analytics
+
+
+# Runs in a worker process. Only the parsed columns are sent over, so the
+# parent never pickles the raw transfer dicts.
+def analyze_wallet(alias, columns):
+    transaction_range = TransactionRange.from_columns(columns)
+    volumes = transaction_range.get_volumes()
+    report = trade.get_portfolio_report(transaction_range)
+    tokens = dict((token, get_token_analytics(transaction_range, token, volumes[token], report[token]))
+        for token in transaction_range.token_list)
+    return alias, dict(address=columns.address, transfers=len(columns), tokens=tokens)
+
+
+def iter_wallet_columns(wallets, start, end, max_threads):
+    aliases = dict((address, alias) for alias, address in wallets)
+    for address, transactions in get_addresses_transactions(list(aliases), start, end, max_threads):
+        yield aliases[address], TransferColumns.from_transactions(address, transactions)
+
+
+# Workers are not forked from this process: the fetch threads may be holding
+# locks (metrics, the rate limiter, sqlite) that a forked child would inherit
+# locked.
+def get_mp_context():
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def run(path, start, end=None, out=None, max_workers=None, max_threads=8):
+    if end is None:
+        end = round(time.time())
+    wallets = [(alias, address.lower()) for alias, address in get_alias_addresses(path)]
+    results, errors = {}, {}
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=get_mp_context()) as executor:
+        # Fetching stays on threads in this process, behind the shared rate
+        # limiter; each wallet is handed to the pool as soon as it arrives.
+        futures = dict((executor.submit(analyze_wallet, alias, columns), alias)
+            for alias, columns in iter_wallet_columns(wallets, start, end, max_threads))
+        for future, alias in futures.items():
+            try:
+                _, results[alias] = future.result()
+            except Exception as e:
+                errors[alias] = str(e)
+    for alias, _ in wallets:
+        if alias not in results and alias not in errors:
+            errors[alias] = 'fetch failed'
+
+    report = dict(generated=round(time.time()), start=start, end=end, wallets=results, errors=errors)
+    if out:
+        tmp = f"{out}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp, out)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute per-token analytics for every wallet in an alias file.')
+    parser.add_argument('path', help='alias,address file')
+    parser.add_argument('--range', default='DAY', choices=[o.name for o in TransactionRangeOptions])
+    parser.add_argument('--start', type=int, help='start timestamp, overrides --range')
+    parser.add_argument('--end', type=int)
+    parser.add_argument('--out', default='report.json')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args(argv)
+    start = args.start or get_timestamp_for_range(TransactionRangeOptions[args.range])
+    report = run(args.path, start, args.end, args.out, args.workers, args.threads)
+    print(f"{len(report['wallets'])} wallets written to {args.out}, {len(report['errors'])} failed",
+        file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import gc
+import sys
+import time
+import argparse
+import tracemalloc
+from collections import Counter
+
+import trade
+from synthetic import generate_transfers
+from transactions import Transactions, TransactionRange
+
+
+# Time and peak memory are taken on separate runs because tracemalloc
+# slows down allocation-heavy code several times over.
+def measure(setup):
+    func = setup()
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+
+    func = setup()
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def make_range(wallet, transfers, columnar=False):
+    start, end = int(transfers[0]['blockNumber']), int(transfers[-1]['blockNumber'])
+    return TransactionRange.from_transactions(wallet, transfers, start, end, columnar=columnar)
+
+
+def consume_token_trades(transactions, method):
+    for token in transactions.token_list:
+        for _ in getattr(transactions, method)(token):
+            pass
+
+
+# The trade generators only pair hashes with one or two legs and raise on
+# routed swaps, so they are timed on the transfers of those hashes alone
+# and labelled "paired" when any were left out.
+def get_paired_transfers(transfers):
+    legs = Counter(tx['hash'] for tx in transfers)
+    return [tx for tx in transfers if legs[tx['hash']] <= 2]
+
+
+def range_statistics(transaction_range):
+    for token in transaction_range.token_list:
+        transaction_range.get_variance(token)
+        transaction_range.get_skew(token)
+
+
+def classify(transaction_range):
+    trade.get_long_only_tokens(transaction_range)
+    trade.get_short_only_tokens(transaction_range)
+    trade.get_net_long_tokens(transaction_range)
+    trade.get_net_short_tokens(transaction_range)
+    for token in transaction_range.token_list:
+        try:
+            trade.get_long_short_percentages(transaction_range, token)
+        except ZeroDivisionError:
+            pass
+
+
+def get_benchmarks(wallet, transfers, columnar):
+    paired = get_paired_transfers(transfers)
+    suffix = '' if len(paired) == len(transfers) else ' (paired)'
+    # Each benchmark gets a fresh object so cached indexes and reports are
+    # rebuilt inside the timed call, as they would be on a new range.
+    return [
+        ('TransactionRange.get_volumes', lambda: make_range(wallet, transfers, columnar).get_volumes),
+        ('TransactionRange.get_trade_table', lambda: make_range(wallet, transfers, columnar).get_trade_table),
+        ('TransactionRange.get_variance/get_skew',
+            lambda: (lambda r: lambda: range_statistics(r))(make_range(wallet, transfers, columnar))),
+        ('trade classifiers', lambda: (lambda r: lambda: classify(r))(make_range(wallet, transfers, columnar))),
+        ('Transactions.get_token_trades' + suffix,
+            lambda: lambda: consume_token_trades(Transactions(wallet, paired), 'get_token_trades')),
+        ('Transactions.get_token_trades2' + suffix,
+            lambda: lambda: consume_token_trades(Transactions(wallet, paired), 'get_token_trades2')),
+    ]
+
+
+def run(sizes, tokens, swap_ratio, multi_leg_ratio, columnar, seed, out=sys.stdout):
+    print(f"{'rows':>9} {'benchmark':<40} {'seconds':>10} {'peak MiB':>10}", file=out)
+    for size in sizes:
+        wallet, transfers = generate_transfers(size, tokens=tokens, swap_ratio=swap_ratio,
+            multi_leg_ratio=multi_leg_ratio, seed=seed)
+        for name, setup in get_benchmarks(wallet, transfers, columnar):
+            try:
+                elapsed, peak = measure(setup)
+            except Exception as e:
+                print(f"{size:>9} {name:<40} failed: {e}", file=out)
+                continue
+            print(f"{size:>9} {name:<40} {elapsed:>10.3f} {peak / 2 ** 20:>10.1f}", file=out)
+        if columnar:
+            elapsed, peak = measure(lambda: lambda: make_range(wallet, transfers, columnar=True))
+            print(f"{size:>9} {'TransferColumns build':<40} {elapsed:>10.3f} {peak / 2 ** 20:>10.1f}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the transaction analytics on synthetic wallets.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--tokens', type=int, default=40)
+    parser.add_argument('--swap-ratio', type=float, default=0.6)
+    parser.add_argument('--multi-leg-ratio', type=float, default=0.0)
+    parser.add_argument('--columnar', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    run(args.sizes, args.tokens, args.swap_ratio, args.multi_leg_ratio, args.columnar, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import os
+import bisect
+import sqlite3
+import threading
+
+from config import get_data_dir
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS timestamp_blocks (
+    timestamp INTEGER PRIMARY KEY,
+    block_number INTEGER NOT NULL
+);
+"""
+
+
+class BlockIndex:
+    def __init__(self, path=None, tolerance=2):
+        if not path:
+            path = os.path.join(get_data_dir(), 'blocks.db')
+        self.path = path
+        self.tolerance = tolerance
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        rows = self._connection.execute(
+            'SELECT timestamp, block_number FROM timestamp_blocks ORDER BY timestamp').fetchall()
+        self._timestamps = [t for t, _ in rows]
+        self._blocks = [b for _, b in rows]
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def close(self):
+        self._connection.close()
+
+    # Each point (t, b) means b was the last block at or before t, so the
+    # answer for any timestamp between two points lies between their blocks.
+    def lookup(self, timestamp):
+        with self._lock:
+            i = bisect.bisect_left(self._timestamps, timestamp)
+            if i < len(self._timestamps) and self._timestamps[i] == timestamp:
+                return self._blocks[i]
+            if i == 0 or i == len(self._timestamps):
+                return None
+            t1, t2 = self._timestamps[i - 1], self._timestamps[i]
+            b1, b2 = self._blocks[i - 1], self._blocks[i]
+
+        if b2 - b1 > self.tolerance:
+            return None
+        return b1 + (b2 - b1) * (timestamp - t1) // (t2 - t1)
+
+    def add(self, timestamp, block):
+        with self._lock:
+            i = bisect.bisect_left(self._timestamps, timestamp)
+            if i < len(self._timestamps) and self._timestamps[i] == timestamp:
+                self._blocks[i] = block
+            else:
+                self._timestamps.insert(i, timestamp)
+                self._blocks.insert(i, block)
+            with self._connection:
+                self._connection.execute('INSERT OR REPLACE INTO timestamp_blocks VALUES (?, ?)',
+                    (timestamp, block))
@@ -0,0 +1,34 @@
+import os
+import json
+import time
+import tempfile
+
+from config import get_data_dir
+
+
+def get_cache_path(name):
+    return os.path.join(get_data_dir(), f"{name}.json")
+
+
+def load_json_cache(name, ttl=None):
+    path = get_cache_path(name)
+    try:
+        if ttl is not None and time.time() - os.path.getmtime(path) > ttl:
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Each writer gets its own temporary file, so concurrent saves of the same
+# cache never replace each other's half-written file.
+def save_json_cache(name, data):
+    path = get_cache_path(name)
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+        json.dump(data, f)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.remove(f.name)
+        raise
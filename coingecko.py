@@ -1,8 +1,15 @@
 import time
 import operator
+import threading
 
 from pycoingecko import CoinGeckoAPI
 
+from cache import load_json_cache, save_json_cache
+from config import get_coins_list_ttl, get_price_ttl, get_exchanges_ttl, get_coingecko_rate_limit
+from prices import PriceStore, CurrentPriceService, get_price_resolution
+from exchanges import ExchangeCache
+from ratelimit import RateLimiter
+
 def group_ids_by_symbol(coin_list):
     grouped = {}
     for entry in coin_list:
@@ -13,21 +20,98 @@ def group_ids_by_symbol(coin_list):
     return grouped
 
 
-api = CoinGeckoAPI()
-main_list = group_ids_by_symbol(api.get_coins_list())
+_api = None
+api_lock = threading.Lock()
+_main_list = None
+contract_list = None
+main_list_lock = threading.Lock()
+price_store = None
+price_store_lock = threading.Lock()
+price_service = None
+exchange_cache = None
+exchange_cache_lock = threading.Lock()
+coingecko_limiter = None
+
+PRICE_FINALITY_SECONDS = 10 * 60
+
+
+def get_contract_key(contract_address, chain='ethereum'):
+    return f"{chain}:{contract_address.lower()}"
+
+
+def index_ids_by_contract(coin_list):
+    index = {}
+    for entry in coin_list:
+        for chain, contract_address in (entry.get('platforms') or {}).items():
+            if chain and contract_address:
+                index[get_contract_key(contract_address, chain)] = entry['id']
+    return index
+
+
+def get_api():
+    global _api
+    limiter = get_coingecko_limiter()
+    with api_lock:
+        if _api is None:
+            from transport import make_coingecko_session
+            _api = CoinGeckoAPI()
+            _api.session = make_coingecko_session(limiter, get_price_ttl(), get_coins_list_ttl(),
+                get_exchanges_ttl())
+    return _api
+
+
+def get_coins_list(refresh=False):
+    cached = None if refresh else load_json_cache('coins_list', get_coins_list_ttl())
+    if cached is None or 'contracts' not in cached:
+        coins = get_api().get_coins_list(include_platform='true')
+        cached = {'coins': coins, 'grouped': group_ids_by_symbol(coins),
+            'contracts': index_ids_by_contract(coins)}
+        save_json_cache('coins_list', cached)
+    return cached
+
+
+def get_main_list():
+    global _main_list
+    with main_list_lock:
+        if _main_list is None:
+            _main_list = get_coins_list()['grouped']
+    return _main_list
+
+
+def get_contract_list():
+    global contract_list
+    with main_list_lock:
+        if contract_list is None:
+            contract_list = get_coins_list()['contracts']
+    return contract_list
+
+
+def get_coin_id_for_contract(contract_address, chain='ethereum'):
+    return get_contract_list().get(get_contract_key(contract_address, chain))
+
+
+def get_coin_ids_for_contracts(contract_addresses, chain='ethereum'):
+    contracts = get_contract_list()
+    return dict((c, contracts.get(get_contract_key(c, chain))) for c in contract_addresses)
+
+
+def get_coin_ids_for_token_info(info, chain='ethereum'):
+    coin_ids = get_coin_ids_for_contracts([i['contractAddress'] for i in info.values()], chain)
+    return dict((token, coin_ids[i['contractAddress']]) for token, i in info.items()
+        if coin_ids[i['contractAddress']])
 
 COINGECKO_CONTRACT_REGEX = '^0X[a-fA-F0-9]{40}$'
 
 
 def get_coin_info(symbol):
     info = {}
-    entries = main_list[symbol]
+    entries = get_main_list()[symbol]
     for entry in entries:
-        info[entry] = api.get_coin_by_id(entry)
+        info[entry] = get_api().get_coin_by_id(entry)
     return info
 
 def get_market_cap_fdv_ratio(coin_id):
-    response = api.get_coin_by_id(coin_id)
+    response = get_api().get_coin_by_id(coin_id)
     market_data = response['market_data']
     market_cap = market_data['market_cap']['usd']
     fdv = market_data['fully_diluted_valuation']['usd']
@@ -35,44 +119,118 @@ def get_market_cap_fdv_ratio(coin_id):
     
 def get_coin_market_data(coin_id, keys=['market_cap']):
     try:
-        market_info = api.get_coin_by_id(coin_id)['market_data']
+        market_info = get_api().get_coin_by_id(coin_id)['market_data']
         market_info = [(k, market_info.get(k)) for k in keys]
         market_info = dict([(k, v) for k, v in market_info.items() if v])
     except:
         return None
 
 
-def get_coin_id_for_symbol(symbol):
+def get_coin_id_for_symbol(symbol, contract_address=None):
     symbol = symbol.lower()
-    entry = main_list.get(symbol, [])
+    entry = get_main_list().get(symbol, [])
     if len(entry) == 0:
         return None
     elif len(entry) == 1:
         return entry[0]
+    elif contract_address:
+        return get_coin_id_for_contract(contract_address)
     else:
-        return duplicate_mappings[symbol]
+        return None
 
 
-def get_prices_for_range(coin_id, from_timestamp, to_timestamp=round(time.time())):
-    from_timestamp = from_timestamp - (5 * 60)
-    response = api.get_coin_market_chart_range_by_id(id=coin_id,
+def get_price_store():
+    global price_store
+    with price_store_lock:
+        if price_store is None:
+            price_store = PriceStore()
+    return price_store
+
+
+def fetch_prices_for_range(coin_id, from_timestamp, to_timestamp):
+    response = get_api().get_coin_market_chart_range_by_id(id=coin_id,
             vs_currency='usd', from_timestamp=from_timestamp, to_timestamp=to_timestamp)
     response = [(round(timestamp/1000), price) for timestamp, price in response['prices']]
     return response
 
 
+def get_prices_for_range(coin_id, from_timestamp, to_timestamp=None):
+    if to_timestamp is None:
+        to_timestamp = round(time.time())
+    from_timestamp = from_timestamp - (5 * 60)
+    store = get_price_store()
+    # Gaps are never longer than the request, so they come back at least as
+    # fine as the resolution the request's span implies.
+    resolution = get_price_resolution(from_timestamp, to_timestamp)
+    # The most recent points are still moving, so they are fetched but not
+    # marked as covered.
+    settled = round(time.time()) - PRICE_FINALITY_SECONDS
+    for gap_start, gap_end in store.get_missing_ranges(coin_id, from_timestamp, to_timestamp, resolution):
+        store.add_prices(coin_id, fetch_prices_for_range(coin_id, gap_start, gap_end),
+            gap_start, min(gap_end, settled), resolution)
+    return store.get_prices(coin_id, from_timestamp, to_timestamp, resolution)
+
+
+def fetch_current_prices(coin_ids):
+    response = get_api().get_price(ids=','.join(coin_ids), vs_currencies='usd')
+    return dict((coin_id, prices.get('usd')) for coin_id, prices in response.items())
+
+
+def get_price_service():
+    global price_service
+    with price_store_lock:
+        if price_service is None:
+            price_service = CurrentPriceService(fetch_current_prices, ttl=get_price_ttl())
+    return price_service
+
+
+def get_current_prices(coin_ids):
+    return get_price_service().get_prices(coin_ids)
+
+
 def get_current_price(coin_id):
-    response = api.get_price(ids=coin_id, vs_currencies='usd')
-    return list(response.values())[0]['usd']
+    return get_current_prices([coin_id])[coin_id]
 
 
-def get_inclusive_price_range(coin_id, from_timestamp, to_timestamp=round(time.time())):
+def get_inclusive_price_range(coin_id, from_timestamp, to_timestamp=None):
     price_range = get_prices_for_range(coin_id, from_timestamp, to_timestamp)
     current_price = get_current_price(coin_id)
     price_range.append([round(time.time()), current_price])
     return dict(price_range)
 
 
+def get_coingecko_limiter():
+    global coingecko_limiter
+    with exchange_cache_lock:
+        if coingecko_limiter is None:
+            coingecko_limiter = RateLimiter(get_coingecko_rate_limit())
+    return coingecko_limiter
+
+
+def fetch_exchange(exchange_id):
+    return get_api().get_exchanges_by_id(exchange_id)
+
+
+def get_exchange_cache():
+    global exchange_cache
+    with exchange_cache_lock:
+        if exchange_cache is None:
+            exchange_cache = ExchangeCache(fetch_exchange, ttl=get_exchanges_ttl())
+    return exchange_cache
+
+
+def preload_exchanges():
+    exchanges, page = [], 1
+    while True:
+        response = get_api().get_exchanges_list(per_page=250, page=page)
+        exchanges += response
+        if len(response) < 250:
+            break
+        page += 1
+    get_exchange_cache().preload(exchanges)
+    return len(exchanges)
+
+
 def ticker_is_onchain(ticker):
     return re.match(COINGECKO_CONTRACT_REGEX, ticker['base']) or re.match(COINGECKO_CONTRACT_REGEX, ticker['target'])
 
@@ -84,7 +242,7 @@ class Coin:
     @classmethod
     def from_coingecko_id(cls, coingecko_id):
         try:
-            return cls(api.get_coin_by_id(coingecko_id))
+            return cls(get_api().get_coin_by_id(coingecko_id))
         except:
             raise
 
@@ -101,7 +259,7 @@ class Coin:
         return self.coingecko_entry['tickers']
      
     def refresh(self):
-        self.coingecko_entry = api.get_coin_by_id(self.coingecko_id)
+        self.coingecko_entry = get_api().get_coin_by_id(self.coingecko_id)
 
     @property
     def current_price(self):
@@ -128,9 +286,9 @@ class Coin:
     def exchange_centralization(self):
         results = []
         exchanges = set([t['market']['identifier'] for t in self.tickers])
+        info = get_exchange_cache().get_many(exchanges, key='centralized')
         for e in exchanges:
-            info = api.get_exchanges_by_id(e)
-            results.append((e, info['centralized']))
+            results.append((e, info[e]['centralized']))
         return results
 
     @property
@@ -188,3 +346,11 @@ class Coin:
         ex = self.sort_tickers_by('volume')[-1]
         return (ex['market']['identifier'], ex['volume'])
 
+
+# `api` and `main_list` are built on first access rather than at import.
+def __getattr__(name):
+    if name == 'api':
+        return get_api()
+    if name == 'main_list':
+        return get_main_list()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
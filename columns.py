@@ -0,0 +1,237 @@
+from datetime import datetime
+
+import numpy as np
+
+from units import convert_token_value
+
+
+def intern(table, key):
+    index = table.get(key)
+    if index is None:
+        index = table[key] = len(table)
+    return index
+
+
+class TransferColumns:
+    def __init__(self, address, timestamps, blocks, token_ids, values, hash_ids, counterparty_ids,
+            tokens, hashes, counterparties, outgoing=None, token_order=None, token_offsets=None):
+        self.address = address
+        self.timestamps = timestamps
+        self.blocks = blocks
+        self.token_ids = token_ids
+        self.values = values
+        self.hash_ids = hash_ids
+        self.counterparty_ids = counterparty_ids
+        self.tokens = tokens
+        self.hashes = hashes
+        self.counterparties = counterparties
+        # Zero-value transfers carry no sign, so direction is kept separately.
+        self.outgoing = values < 0 if outgoing is None else outgoing
+        self._token_index = dict((t, i) for i, t in enumerate(tokens))
+        # Rows grouped by token, keeping transaction order inside each group.
+        # Archives store the grouping so a mapped reload skips the sort.
+        if token_order is None or token_offsets is None:
+            token_order = np.argsort(token_ids, kind='stable')
+            counts = np.bincount(token_ids, minlength=len(tokens))
+            token_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._token_order = token_order
+        self._token_offsets = np.asarray(token_offsets, dtype=np.int64)
+        self._balance_changes = None
+
+    @classmethod
+    def from_transactions(cls, address, transactions):
+        tokens, hashes, counterparties = {}, {}, {}
+        timestamps, blocks, token_ids, values, hash_ids, counterparty_ids, outgoings = [], [], [], [], [], [], []
+        for tx in transactions:
+            try:
+                outgoing = tx['from'] == address
+                value = convert_token_value(tx['value'], tx['tokenDecimal'])
+                row = (int(tx['timeStamp']), int(tx['blockNumber']), tx['tokenSymbol'], tx['hash'],
+                    tx['to'] if outgoing else tx['from'])
+            except KeyError:
+                print(f"Malformed transaction: {tx}")
+                continue
+            timestamp, block, symbol, trade_hash, counterparty = row
+            timestamps.append(timestamp)
+            blocks.append(block)
+            token_ids.append(intern(tokens, symbol))
+            values.append(-value if outgoing else value)
+            hash_ids.append(intern(hashes, trade_hash))
+            counterparty_ids.append(intern(counterparties, counterparty))
+            outgoings.append(outgoing)
+
+        return cls(address,
+            np.array(timestamps, dtype=np.int64),
+            np.array(blocks, dtype=np.int64),
+            np.array(token_ids, dtype=np.int32),
+            np.array(values, dtype=np.float64),
+            np.array(hash_ids, dtype=np.int64),
+            np.array(counterparty_ids, dtype=np.int32),
+            list(tokens), list(hashes), list(counterparties), np.array(outgoings, dtype=bool))
+
+    # Only the parsed columns cross process boundaries; the token grouping is
+    # rebuilt on the other side.
+    def __reduce__(self):
+        return (TransferColumns, (self.address, self.timestamps, self.blocks, self.token_ids, self.values,
+            self.hash_ids, self.counterparty_ids, self.tokens, self.hashes, self.counterparties, self.outgoing))
+
+    def __len__(self):
+        return len(self.values)
+
+    def get_token_rows(self, token):
+        token_id = self._token_index.get(token)
+        if token_id is None:
+            return np.empty(0, dtype=np.int64)
+        return self._token_order[self._token_offsets[token_id]:self._token_offsets[token_id + 1]]
+
+    def get_trades(self, token, include_hash=False, readable_timestamp=True):
+        trades = []
+        for row in self.get_token_rows(token):
+            trades.append(self._get_trade(row, token, include_hash, readable_timestamp))
+        return trades
+
+    def _get_trade(self, row, token, include_hash, readable_timestamp):
+        timestamp = int(self.timestamps[row])
+        if readable_timestamp:
+            timestamp = str(datetime.fromtimestamp(timestamp))
+        trade = (timestamp, token, float(self.values[row]))
+        if include_hash:
+            return self.hashes[self.hash_ids[row]], trade
+        return trade
+
+    def get_volumes(self):
+        volumes = np.bincount(self.token_ids, weights=self.values, minlength=len(self.tokens))
+        return dict(zip(self.tokens, volumes.tolist()))
+
+    def get_long_short_volumes(self):
+        size = len(self.tokens)
+        long_rows = self.values > 0
+        long_volumes = np.bincount(self.token_ids, weights=np.where(long_rows, self.values, 0), minlength=size)
+        short_volumes = np.bincount(self.token_ids, weights=np.where(long_rows, 0, self.values), minlength=size)
+        long_counts = np.bincount(self.token_ids[long_rows], minlength=size)
+        short_counts = np.bincount(self.token_ids, minlength=size) - long_counts
+        return dict(zip(self.tokens, zip(long_volumes.tolist(), short_volumes.tolist(),
+            long_counts.tolist(), short_counts.tolist())))
+
+    def get_volume(self, token):
+        return float(self.values[self.get_token_rows(token)].sum())
+
+    def is_long_only(self, token):
+        return bool(np.all(self.values[self.get_token_rows(token)] > 0))
+
+    def is_short_only(self, token):
+        return bool(np.all(self.values[self.get_token_rows(token)] < 0))
+
+    def get_trade_table(self):
+        table = {}
+        for row in self._token_order:
+            trade_hash, trade = self._get_trade(row, self.tokens[self.token_ids[row]], True, True)
+            if table.get(trade_hash):
+                table[trade_hash].append(trade)
+            else:
+                table[trade_hash] = [trade]
+        return table
+
+    def get_cumulative_balances(self, token):
+        rows = self.get_token_rows(token)
+        for trade, balance in zip(self.get_trades(token), np.cumsum(self.values[rows]).tolist()):
+            yield trade + (balance,)
+
+    def get_balance_changes(self):
+        if self._balance_changes is not None:
+            return self._balance_changes
+
+        # Running balances are summed inside each token's segment so tokens of
+        # very different magnitudes never cancel against each other.
+        ordered = self.values[self._token_order]
+        balances = np.empty(len(ordered))
+        starts = self._token_offsets[:-1]
+        for start, end in zip(starts, self._token_offsets[1:]):
+            np.cumsum(ordered[start:end], out=balances[start:end])
+
+        # A change is only defined between consecutive rows of the same token.
+        same_token = np.ones(len(balances), dtype=bool)
+        same_token[starts] = False
+        previous = np.roll(balances, 1)
+        changes = np.zeros(len(balances))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            changes[same_token] = (balances[same_token] - previous[same_token]) / previous[same_token]
+
+        self._balance_changes = {}
+        for token_id, token in enumerate(self.tokens):
+            start, end = self._token_offsets[token_id], self._token_offsets[token_id + 1]
+            self._balance_changes[token] = changes[start + 1:end]
+        return self._balance_changes
+
+    def get_trade_balance_changes(self, token):
+        changes = self.get_balance_changes().get(token)
+        if changes is None:
+            return np.zeros(1)
+        if not np.all(np.isfinite(changes)):
+            raise ZeroDivisionError("float division by zero")
+        return changes
+
+    def get_variance(self, token):
+        changes = self.get_trade_balance_changes(token)
+        if len(changes) == 0:
+            return 0
+        return float(np.mean((changes - changes.mean()) ** 2))
+
+    def get_skew(self, token):
+        changes = self.get_trade_balance_changes(token)
+        sample_size = len(changes)
+        sd = np.sqrt(self.get_variance(token))
+        if sample_size <= 1 or sd == 0:
+            return 0
+        skew = np.sum((changes - changes.mean()) ** 3)
+        return float(skew / ((sample_size - 1) * (sd ** 3)))
+
+
+class TimeIndex:
+    # Per-token prefix sums over timestamp-sorted rows, so the totals for any
+    # time window are two binary searches and a subtraction per token.
+    def __init__(self, columns):
+        self.tokens = list(columns.tokens)
+        self._token_index = dict((t, i) for i, t in enumerate(self.tokens))
+        self._timestamps = []
+        self._volumes = []
+        self._long_volumes = []
+        self._long_counts = []
+        for token in self.tokens:
+            rows = columns.get_token_rows(token)
+            order = np.argsort(columns.timestamps[rows], kind='stable')
+            rows = rows[order]
+            values = columns.values[rows]
+            self._timestamps.append(columns.timestamps[rows])
+            self._volumes.append(np.concatenate([[0], np.cumsum(values)]))
+            self._long_volumes.append(np.concatenate([[0], np.cumsum(np.where(values > 0, values, 0))]))
+            self._long_counts.append(np.concatenate([[0], np.cumsum(values > 0)]))
+
+    def _get_bounds(self, token_id, start, end):
+        timestamps = self._timestamps[token_id]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, 'left'))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, 'right'))
+        return lo, max(lo, hi)
+
+    def get_window(self, start=None, end=None):
+        window = {}
+        for token_id, token in enumerate(self.tokens):
+            lo, hi = self._get_bounds(token_id, start, end)
+            volume = float(self._volumes[token_id][hi] - self._volumes[token_id][lo])
+            long_volume = float(self._long_volumes[token_id][hi] - self._long_volumes[token_id][lo])
+            long_count = int(self._long_counts[token_id][hi] - self._long_counts[token_id][lo])
+            window[token] = (volume, long_volume, volume - long_volume, long_count, hi - lo - long_count)
+        return window
+
+    def get_volumes(self, start=None, end=None):
+        return dict((token, v[0]) for token, v in self.get_window(start, end).items())
+
+    def get_counts(self, start=None, end=None):
+        return dict((token, v[3] + v[4]) for token, v in self.get_window(start, end).items())
+
+    def get_volume_after(self, token, timestamp):
+        token_id = self._token_index.get(token)
+        if token_id is None:
+            return 0
+        lo, hi = self._get_bounds(token_id, None, timestamp)
+        return float(self._volumes[token_id][-1] - self._volumes[token_id][hi])
@@ -11,3 +11,31 @@ def get_config(path=None):
 def get_etherscan_api_key():
     return get_config()['etherscan']['api_key']
 
+
+def get_data_dir():
+    config = get_config()
+    default = os.path.join(os.path.expanduser('~'), '.cspan')
+    path = config.get('cspan', 'data_dir', fallback=default)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def get_etherscan_rate_limit():
+    return get_config().getfloat('etherscan', 'rate_limit', fallback=5)
+
+def get_balance_ttl():
+    return get_config().getint('etherscan', 'balance_ttl', fallback=15)
+
+def get_block_tolerance():
+    return get_config().getint('etherscan', 'block_tolerance', fallback=2)
+
+def get_coins_list_ttl():
+    return get_config().getint('coingecko', 'coins_list_ttl', fallback=24 * 60 * 60)
+
+def get_price_ttl():
+    return get_config().getint('coingecko', 'price_ttl', fallback=30)
+
+def get_exchanges_ttl():
+    return get_config().getint('coingecko', 'exchanges_ttl', fallback=7 * 24 * 60 * 60)
+
+def get_coingecko_rate_limit():
+    return get_config().getfloat('coingecko', 'rate_limit', fallback=0.5)
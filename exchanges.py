@@ -0,0 +1,64 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import load_json_cache, save_json_cache
+
+
+# Exchange detail responses carry large ticker lists that are not needed
+# for metadata lookups.
+UNCACHED_KEYS = ['tickers', 'status_updates']
+
+
+class ExchangeCache:
+    def __init__(self, fetch, ttl=24 * 60 * 60, name='exchanges', max_workers=4):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.name = name
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._entries = load_json_cache(name) or {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def save(self):
+        with self._lock:
+            entries = dict(self._entries)
+        save_json_cache(self.name, entries)
+
+    def _is_fresh(self, exchange_id, key=None):
+        entry = self._entries.get(exchange_id)
+        if not entry or time.time() - entry['fetched_at'] > self.ttl:
+            return False
+        return key is None or key in entry['data']
+
+    def _put(self, exchange_id, data):
+        data = dict((k, v) for k, v in data.items() if k not in UNCACHED_KEYS)
+        with self._lock:
+            entry = self._entries.get(exchange_id)
+            if entry and time.time() - entry['fetched_at'] <= self.ttl:
+                data = dict(entry['data'], **data)
+            self._entries[exchange_id] = {'fetched_at': time.time(), 'data': data}
+
+    def preload(self, exchanges):
+        for exchange in exchanges:
+            self._put(exchange['id'], exchange)
+        self.save()
+
+    def get(self, exchange_id, key=None):
+        return self.get_many([exchange_id], key)[exchange_id]
+
+    def get_many(self, exchange_ids, key=None):
+        exchange_ids = list(dict.fromkeys(exchange_ids))
+        with self._lock:
+            missing = [e for e in exchange_ids if not self._is_fresh(e, key)]
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for exchange_id, data in zip(missing, executor.map(self.fetch, missing)):
+                    self._put(exchange_id, data)
+            self.save()
+
+        with self._lock:
+            return dict((e, self._entries[e]['data']) for e in exchange_ids)
@@ -0,0 +1,187 @@
+import numpy as np
+
+from columns import intern
+from addressbook import normalize_address
+
+
+def gather(indptr, nodes):
+    # Positions of every edge leaving the given nodes, without a Python loop.
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return offsets + np.arange(total)
+
+
+class Adjacency:
+    def __init__(self, size, sources, targets, tokens, values, counts):
+        order = np.lexsort((tokens, targets, sources))
+        # Position of each edge in the arrays it was built from.
+        self.order = order
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=size))]).astype(np.int64)
+        self.indices = targets[order]
+        self.tokens = tokens[order]
+        self.values = values[order]
+        self.counts = counts[order]
+
+    def get_edges(self, nodes, token_id=None):
+        edges = gather(self.indptr, np.asarray(nodes, dtype=np.int64))
+        if token_id is not None:
+            edges = edges[self.tokens[edges] == token_id]
+        return edges
+
+    def get_neighbours(self, nodes, token_id=None):
+        return np.unique(self.indices[self.get_edges(nodes, token_id)])
+
+
+class FlowGraph:
+    def __init__(self, addresses, tokens, sources, targets, token_ids, values, counts, wallets=()):
+        self.addresses = addresses
+        self.tokens = tokens
+        self.wallets = set(wallets)
+        self._address_index = dict((a, i) for i, a in enumerate(addresses))
+        self._token_index = dict((t, i) for i, t in enumerate(tokens))
+        self.out_edges = Adjacency(len(addresses), sources, targets, token_ids, values, counts)
+        self.sources = np.repeat(np.arange(len(addresses), dtype=np.int32), np.diff(self.out_edges.indptr))
+        self._in_edges = None
+
+    # Transfers between two tracked wallets show up in both of their ranges,
+    # so only the sender's copy is kept.
+    @classmethod
+    def from_columns(cls, columns_list):
+        columns_list = list(columns_list)
+        addresses, tokens = {}, {}
+        wallets = set(normalize_address(columns.address) for columns in columns_list)
+        for wallet in wallets:
+            intern(addresses, wallet)
+
+        sources, targets, token_ids, values = [], [], [], []
+        for columns in columns_list:
+            wallet = addresses[normalize_address(columns.address)]
+            counterparties = [normalize_address(a) for a in columns.counterparties]
+            counterparty_ids = np.array([intern(addresses, a) for a in counterparties], dtype=np.int64)
+            tracked = np.array([a in wallets for a in counterparties], dtype=bool)
+            global_tokens = np.array([intern(tokens, t) for t in columns.tokens], dtype=np.int64)
+            if not len(columns):
+                continue
+            outgoing = columns.outgoing
+            rows = outgoing | ~tracked[columns.counterparty_ids]
+            outgoing = outgoing[rows]
+            counterparty = counterparty_ids[columns.counterparty_ids[rows]]
+            sources.append(np.where(outgoing, wallet, counterparty))
+            targets.append(np.where(outgoing, counterparty, wallet))
+            token_ids.append(global_tokens[columns.token_ids[rows]])
+            values.append(np.abs(columns.values[rows]))
+
+        sources, targets, token_ids, values = [np.concatenate(a) if a else np.empty(0, dtype=np.int64)
+            for a in [sources, targets, token_ids, values]]
+        # One edge per (source, target, token), weighted by value and count.
+        size, token_count = max(len(addresses), 1), max(len(tokens), 1)
+        keys = (sources * size + targets) * token_count + token_ids
+        keys, inverse = np.unique(keys, return_inverse=True)
+        edge_values = np.bincount(inverse, weights=values.astype(np.float64), minlength=len(keys))
+        edge_counts = np.bincount(inverse, minlength=len(keys)).astype(np.int32)
+        token_ids = (keys % token_count).astype(np.int32)
+        targets = (keys // token_count % size).astype(np.int32)
+        sources = (keys // token_count // size).astype(np.int64)
+        return cls(list(addresses), list(tokens), sources, targets, token_ids, edge_values, edge_counts, wallets)
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        return cls.from_columns([r.get_columns() for r in ranges])
+
+    def __len__(self):
+        return len(self.out_edges.indices)
+
+    @property
+    def in_edges(self):
+        if self._in_edges is None:
+            edges = self.out_edges
+            self._in_edges = Adjacency(len(self.addresses), edges.indices.astype(np.int64),
+                self.sources, edges.tokens, edges.values, edges.counts)
+        return self._in_edges
+
+    def get_id(self, address):
+        return self._address_index.get(normalize_address(address))
+
+    def _get_token_id(self, token):
+        if token is None:
+            return None
+        return self._token_index.get(token, -1)
+
+    def _get_adjacencies(self, direction):
+        if direction == 'out':
+            return [self.out_edges]
+        elif direction == 'in':
+            return [self.in_edges]
+        elif direction == 'both':
+            return [self.out_edges, self.in_edges]
+        raise Exception("Invalid direction.")
+
+    def _get_neighbour_ids(self, nodes, direction, token_id):
+        neighbours = [edges.get_neighbours(nodes, token_id) for edges in self._get_adjacencies(direction)]
+        return np.unique(np.concatenate(neighbours))
+
+    def get_neighbours(self, address, direction='both', token=None):
+        node = self.get_id(address)
+        if node is None:
+            return []
+        ids = self._get_neighbour_ids([node], direction, self._get_token_id(token))
+        return [self.addresses[i] for i in ids]
+
+    def get_neighbourhood(self, address, hops=2, direction='both', token=None):
+        node = self.get_id(address)
+        if node is None:
+            return {}
+        token_id = self._get_token_id(token)
+        distances = np.full(len(self.addresses), -1, dtype=np.int32)
+        distances[node] = 0
+        frontier = np.array([node], dtype=np.int64)
+        for hop in range(1, hops + 1):
+            if not len(frontier):
+                break
+            frontier = self._get_neighbour_ids(frontier, direction, token_id)
+            frontier = frontier[distances[frontier] < 0]
+            distances[frontier] = hop
+        reached = np.nonzero(distances > 0)[0]
+        return dict((self.addresses[i], int(distances[i])) for i in reached)
+
+    def get_shared_counterparties(self, addresses, direction='both', token=None, min_wallets=2):
+        token_id = self._get_token_id(token)
+        nodes = [n for n in map(self.get_id, addresses) if n is not None]
+        if not nodes:
+            return {}
+        neighbours = np.concatenate([self._get_neighbour_ids([n], direction, token_id) for n in nodes])
+        ids, counts = np.unique(neighbours, return_counts=True)
+        shared = counts >= min_wallets
+        return dict((self.addresses[i], int(c)) for i, c in zip(ids[shared], counts[shared]))
+
+    def get_top_flows(self, n=10, token=None, address=None, direction='out', by='value'):
+        edges = self.out_edges
+        if address is None:
+            selected = np.arange(len(edges.indices))
+        else:
+            node = self.get_id(address)
+            if node is None:
+                return []
+            selected = []
+            for adjacency in self._get_adjacencies(direction):
+                positions = adjacency.get_edges([node])
+                if adjacency is self._in_edges:
+                    # In-edges were built from the out-edge arrays, so this
+                    # maps them back onto out-edge positions.
+                    positions = adjacency.order[positions]
+                selected.append(positions)
+            selected = np.unique(np.concatenate(selected))
+        token_id = self._get_token_id(token)
+        if token_id is not None:
+            selected = selected[edges.tokens[selected] == token_id]
+        weights = (edges.values if by == 'value' else edges.counts)[selected]
+        if len(selected) > n:
+            top = np.argpartition(-weights, n)[:n]
+            selected, weights = selected[top], weights[top]
+        selected = selected[np.argsort(-weights, kind='stable')]
+        return [(self.addresses[self.sources[e]], self.addresses[edges.indices[e]], self.tokens[edges.tokens[e]],
+            float(edges.values[e]), int(edges.counts[e])) for e in selected]
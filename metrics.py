@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import cProfile
+import functools
+import threading
+from contextlib import contextmanager
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._summaries = {}
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            count, total, maximum = self._summaries.get(key, (0, 0, None))
+            maximum = value if maximum is None else max(maximum, value)
+            self._summaries[key] = (count + 1, total + value, maximum)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+
+    def snapshot(self):
+        with self._lock:
+            counters = [dict(name=name, labels=dict(labels), value=value)
+                for (name, labels), value in self._counters.items()]
+            summaries = [dict(name=name, labels=dict(labels), count=count, sum=total, max=maximum)
+                for (name, labels), (count, total, maximum) in self._summaries.items()]
+        return dict(timestamp=time.time(), counters=counters, summaries=summaries)
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines, typed = [], set()
+        for counter in sorted(snapshot['counters'], key=lambda c: c['name']):
+            if counter['name'] not in typed:
+                lines.append(f"# TYPE {counter['name']} counter")
+                typed.add(counter['name'])
+            lines.append(f"{counter['name']}{format_labels(counter['labels'])} {counter['value']}")
+        summaries = sorted(snapshot['summaries'], key=lambda s: s['name'])
+        for summary in summaries:
+            name, labels = summary['name'], format_labels(summary['labels'])
+            if name not in typed:
+                lines.append(f"# TYPE {name} summary")
+                typed.add(name)
+            lines.append(f"{name}_count{labels} {summary['count']}")
+            lines.append(f"{name}_sum{labels} {summary['sum']}")
+        # A summary has no max sample, so the maximum is its own gauge family
+        # and its samples have to follow their own TYPE line.
+        for summary in summaries:
+            name = f"{summary['name']}_max"
+            if name not in typed:
+                lines.append(f"# TYPE {name} gauge")
+                typed.add(name)
+            lines.append(f"{name}{format_labels(summary['labels'])} {summary['max']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        content = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in sorted(labels.items())]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+@contextmanager
+def profile(path=None):
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+metrics = Metrics()
+increment = metrics.increment
+observe = metrics.observe
+timer = metrics.timer
+timed = metrics.timed
@@ -18,7 +18,25 @@ def get_unix_time_from_timestamp(timestamp):
     return round(time.mktime(timestamp.timetuple()))
 
 
-def get_timestamp_for_range(option, fromdate=datetime.utcnow()):
+STANDARD_RANGES = [
+    TransactionRangeOptions.DAY,
+    TransactionRangeOptions.WEEK,
+    TransactionRangeOptions.MONTH,
+    TransactionRangeOptions.YEAR_START,
+]
+
+
+def get_timestamps_for_ranges(options=STANDARD_RANGES, fromdate=None):
+    # One reference time for every window so they line up with each other.
+    if fromdate is None:
+        fromdate = datetime.utcnow()
+    return dict((option, get_timestamp_for_range(option, fromdate)) for option in options)
+
+
+def get_timestamp_for_range(option, fromdate=None):
+    if fromdate is None:
+        fromdate = datetime.utcnow()
+
     if option == TransactionRangeOptions.DAY:
         timestamp = fromdate - timedelta(days=1)
         return get_unix_time_from_timestamp(timestamp)
@@ -0,0 +1,69 @@
+import numpy as np
+
+from coingecko import get_coin_ids_for_token_info, get_prices_for_range, get_current_prices
+
+
+def align_prices(timestamps, price_timestamps, prices):
+    # Each transfer takes the last price at or before it, or the first
+    # price when it predates the series.
+    index = np.searchsorted(price_timestamps, timestamps, side='right') - 1
+    return prices[np.clip(index, 0, len(prices) - 1)]
+
+
+# Average cost accounting over a signed position: transfers in the same
+# direction as the position add to its cost, transfers against it realize
+# the difference to the average cost, and any excess opens the other side.
+def get_position_pnl(values, prices, mark_price):
+    position, cost, realized = 0.0, 0.0, 0.0
+    for value, price in zip(values.tolist(), prices.tolist()):
+        if position == 0 or (value > 0) == (position > 0):
+            position += value
+            cost += value * price
+            continue
+        average = cost / position
+        closed = min(abs(value), abs(position))
+        sign = 1 if position > 0 else -1
+        realized += sign * closed * (price - average)
+        position -= sign * closed
+        cost -= sign * closed * average
+        remaining = abs(value) - closed
+        if remaining > 0:
+            position = -sign * remaining
+            cost = position * price
+
+    average = cost / position if position else 0
+    return dict(position=position, cost_basis=cost, average_cost=average, realized_pnl=realized,
+        unrealized_pnl=position * mark_price - cost, mark_price=mark_price)
+
+
+def get_range_pnl(transaction_range, coin_ids=None):
+    columns = transaction_range.get_columns()
+    if len(columns) == 0:
+        return {}, np.zeros(0)
+    if coin_ids is None:
+        coin_ids = get_coin_ids_for_token_info(transaction_range.get_info())
+
+    start, end = int(columns.timestamps.min()), int(columns.timestamps.max())
+    current_prices = get_current_prices([coin_ids[t] for t in columns.tokens if t in coin_ids])
+    notional = np.full(len(columns), np.nan)
+    report = {}
+    for token in columns.tokens:
+        coin_id = coin_ids.get(token)
+        if not coin_id:
+            continue
+        series = get_prices_for_range(coin_id, start, end)
+        if not series:
+            continue
+        price_timestamps, prices = (np.array(a) for a in zip(*series))
+        rows = columns.get_token_rows(token)
+        values = columns.values[rows]
+        row_prices = align_prices(columns.timestamps[rows], price_timestamps, prices)
+        notional[rows] = values * row_prices
+
+        mark_price = current_prices.get(coin_id) or float(prices[-1])
+        pnl = get_position_pnl(values, row_prices, mark_price)
+        pnl['coin_id'] = coin_id
+        pnl['volume_usd'] = float(np.abs(notional[rows]).sum())
+        pnl['net_flow_usd'] = float(notional[rows].sum())
+        report[token] = pnl
+    return report, notional
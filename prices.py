@@ -0,0 +1,175 @@
+import os
+import time
+import bisect
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+from config import get_data_dir
+from store import merge_ranges, get_missing_ranges
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    coin_id TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (coin_id, resolution, timestamp)
+);
+CREATE TABLE IF NOT EXISTS covered_ranges (
+    coin_id TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    start_timestamp INTEGER NOT NULL,
+    end_timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS covered_ranges_coin_id ON covered_ranges (coin_id, resolution);
+"""
+
+# CoinGecko picks the spacing of market_chart/range points from the span
+# requested, so each span is only ever served from points of its own spacing.
+RESOLUTIONS = [(24 * 60 * 60, 5 * 60), (90 * 24 * 60 * 60, 60 * 60)]
+DAILY = 24 * 60 * 60
+
+
+def get_price_resolution(start, end):
+    for span, resolution in RESOLUTIONS:
+        if end - start <= span:
+            return resolution
+    return DAILY
+
+
+class PriceSeries:
+    def __init__(self, timestamps, prices, ranges):
+        self.timestamps = timestamps
+        self.prices = prices
+        self.ranges = ranges
+
+    def merge(self, points):
+        for timestamp, price in points:
+            i = bisect.bisect_left(self.timestamps, timestamp)
+            if i < len(self.timestamps) and self.timestamps[i] == timestamp:
+                self.prices[i] = price
+            else:
+                self.timestamps.insert(i, timestamp)
+                self.prices.insert(i, price)
+
+    def get_range(self, start, end):
+        i = bisect.bisect_left(self.timestamps, start)
+        j = bisect.bisect_right(self.timestamps, end)
+        return list(zip(self.timestamps[i:j], self.prices[i:j]))
+
+
+class PriceStore:
+    def __init__(self, path=None):
+        if not path:
+            path = os.path.join(get_data_dir(), 'prices.db')
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._drop_unresolved_tables()
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._series = {}
+
+    # Caches written before resolutions were tracked cannot say what spacing
+    # they cover, so they are dropped and refetched.
+    def _drop_unresolved_tables(self):
+        columns = [row[1] for row in self._connection.execute('PRAGMA table_info(covered_ranges)')]
+        if columns and 'resolution' not in columns:
+            with self._connection:
+                self._connection.execute('DROP TABLE prices')
+                self._connection.execute('DROP TABLE covered_ranges')
+
+    def close(self):
+        self._connection.close()
+
+    def get_series(self, coin_id, resolution):
+        with self._lock:
+            series = self._series.get((coin_id, resolution))
+            if series is None:
+                rows = self._connection.execute(
+                    'SELECT timestamp, price FROM prices WHERE coin_id = ? AND resolution = ? ORDER BY timestamp',
+                    (coin_id, resolution)).fetchall()
+                ranges = self._connection.execute(
+                    'SELECT start_timestamp, end_timestamp FROM covered_ranges WHERE coin_id = ? AND resolution = ?',
+                    (coin_id, resolution)).fetchall()
+                series = PriceSeries([t for t, _ in rows], [p for _, p in rows], merge_ranges(ranges))
+                self._series[(coin_id, resolution)] = series
+            return series
+
+    def get_missing_ranges(self, coin_id, start, end, resolution):
+        with self._lock:
+            return get_missing_ranges(self.get_series(coin_id, resolution).ranges, start, end)
+
+    def add_prices(self, coin_id, points, start, end, resolution):
+        with self._lock, self._connection:
+            series = self.get_series(coin_id, resolution)
+            series.merge(points)
+            if start <= end:
+                series.ranges = merge_ranges(series.ranges + [(start, end)])
+            self._connection.executemany('INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?)',
+                [(coin_id, resolution, t, p) for t, p in points])
+            self._connection.execute('DELETE FROM covered_ranges WHERE coin_id = ? AND resolution = ?',
+                (coin_id, resolution))
+            self._connection.executemany('INSERT INTO covered_ranges VALUES (?, ?, ?, ?)',
+                [(coin_id, resolution, s, e) for s, e in series.ranges])
+
+    def get_prices(self, coin_id, start, end, resolution):
+        with self._lock:
+            return self.get_series(coin_id, resolution).get_range(start, end)
+
+
+class CurrentPriceService:
+    def __init__(self, fetch, ttl=30, batch_size=250):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self._cache = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    # Ids already being fetched by another caller are waited on rather than
+    # requested again; the rest are fetched here in as few calls as possible.
+    def get_prices(self, coin_ids):
+        coin_ids = list(dict.fromkeys(coin_ids))
+        prices, futures, owned = {}, {}, []
+        now = time.monotonic()
+        with self._lock:
+            for coin_id in coin_ids:
+                cached = self._cache.get(coin_id)
+                if cached and now - cached[0] < self.ttl:
+                    prices[coin_id] = cached[1]
+                elif coin_id in self._in_flight:
+                    futures[coin_id] = self._in_flight[coin_id]
+                else:
+                    futures[coin_id] = self._in_flight[coin_id] = Future()
+                    owned.append(coin_id)
+
+        if owned:
+            self._fetch(owned)
+        for coin_id, future in futures.items():
+            prices[coin_id] = future.result()
+        return prices
+
+    def _fetch(self, coin_ids):
+        remaining = list(coin_ids)
+        try:
+            while remaining:
+                batch, remaining = remaining[:self.batch_size], remaining[self.batch_size:]
+                result = self.fetch(batch)
+                self._resolve(batch, result)
+        except Exception as e:
+            with self._lock:
+                for coin_id in remaining + batch:
+                    future = self._in_flight.pop(coin_id, None)
+                    if future and not future.done():
+                        future.set_exception(e)
+            raise
+
+    def _resolve(self, coin_ids, result):
+        now = time.monotonic()
+        with self._lock:
+            for coin_id in coin_ids:
+                price = result.get(coin_id)
+                self._cache[coin_id] = (now, price)
+                self._in_flight.pop(coin_id).set_result(price)
@@ -0,0 +1,40 @@
+import time
+import threading
+
+
+class RateLimiter:
+    # A bucket of one spaces calls 1 / rate apart, so no one-second window
+    # sees more than rate calls. A larger capacity allows bursts on top.
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        # acquire() needs a whole token, so a bucket smaller than one (as a
+        # rate below 1/s used to imply) would never fill far enough.
+        self.capacity = max(1, capacity or 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        if tokens > self.capacity:
+            raise ValueError(f"Cannot acquire {tokens} tokens from a bucket of {self.capacity}")
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
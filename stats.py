@@ -0,0 +1,159 @@
+import math
+
+from units import convert_token_value
+
+
+class RunningMoments:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0
+        self._m2 = 0
+        self._m3 = 0
+
+    # Welford's update extended to the third moment (Terriberry).
+    def add(self, x):
+        n1 = self.count
+        self.count += 1
+        n = self.count
+        delta = x - self.mean
+        delta_n = delta / n
+        term1 = delta * delta_n * n1
+        self.mean += delta_n
+        self._m3 += term1 * delta_n * (n - 2) - 3 * delta_n * self._m2
+        self._m2 += term1
+
+    # The same state as adding every value in turn, computed in one pass
+    # over an array.
+    @classmethod
+    def from_values(cls, values):
+        moments = cls()
+        moments.count = len(values)
+        if moments.count:
+            moments.mean = float(values.mean())
+            deviations = values - moments.mean
+            moments._m2 = float((deviations ** 2).sum())
+            moments._m3 = float((deviations ** 3).sum())
+        return moments
+
+    @property
+    def variance(self):
+        if self.count == 0:
+            return 0
+        return self._m2 / self.count
+
+    @property
+    def standard_deviation(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def skew(self):
+        try:
+            return self._m3 / ((self.count - 1) * (self.standard_deviation ** 3))
+        except ZeroDivisionError:
+            return 0
+
+
+class TokenStatistics:
+    def __init__(self, token):
+        self.token = token
+        self.trades = 0
+        self.balance = 0
+        self.undefined = False
+        self.moments = RunningMoments()
+
+    # Moments are taken over the relative change of the running balance
+    # between consecutive trades, as in TransactionRange.get_trade_balance_changes.
+    def add(self, value):
+        previous = self.balance
+        self.balance += value
+        self.trades += 1
+        if self.trades == 1:
+            return
+        if previous == 0:
+            self.undefined = True
+        else:
+            self.moments.add((self.balance - previous) / previous)
+
+    # values are the token's signed transfer values in order and changes the
+    # relative balance changes between them, as TransferColumns computes them.
+    @classmethod
+    def from_values(cls, token, values, changes):
+        stats = cls(token)
+        stats.trades = len(values)
+        stats.balance = float(values.sum())
+        if len(changes) and not all(map(math.isfinite, changes.tolist())):
+            stats.undefined = True
+        else:
+            stats.moments = RunningMoments.from_values(changes)
+        return stats
+
+    def _check(self):
+        if self.undefined:
+            raise ZeroDivisionError("float division by zero")
+
+    @property
+    def mean(self):
+        self._check()
+        return self.moments.mean
+
+    @property
+    def variance(self):
+        self._check()
+        return self.moments.variance
+
+    @property
+    def standard_deviation(self):
+        self._check()
+        return self.moments.standard_deviation
+
+    @property
+    def skew(self):
+        self._check()
+        return self.moments.skew
+
+    def to_dict(self):
+        if self.undefined:
+            return dict(trades=self.trades, balance=self.balance, mean=None, variance=None,
+                standard_deviation=None, skew=None)
+        return dict(trades=self.trades, balance=self.balance, mean=self.mean, variance=self.variance,
+            standard_deviation=self.standard_deviation, skew=self.skew)
+
+
+class TransactionStatistics:
+    def __init__(self, address):
+        self.address = address
+        self.tokens = {}
+
+    @classmethod
+    def from_columns(cls, columns):
+        statistics = cls(columns.address)
+        changes = columns.get_balance_changes()
+        for token in columns.tokens:
+            values = columns.values[columns.get_token_rows(token)]
+            statistics.tokens[token] = TokenStatistics.from_values(token, values, changes[token])
+        return statistics
+
+    def __contains__(self, token):
+        return token in self.tokens
+
+    def __getitem__(self, token):
+        return self.tokens[token]
+
+    def add_transaction(self, transaction):
+        symbol = transaction['tokenSymbol']
+        value = convert_token_value(transaction['value'], transaction['tokenDecimal'])
+        if transaction['from'] == self.address:
+            value = -value
+        if symbol not in self.tokens:
+            self.tokens[symbol] = TokenStatistics(symbol)
+        self.tokens[symbol].add(value)
+
+    def add_transactions(self, transactions):
+        for transaction in transactions:
+            try:
+                self.add_transaction(transaction)
+            except KeyError:
+                print(f"Malformed transaction: {transaction}")
+
+    def get_statistics(self):
+        return dict((token, stats.to_dict()) for token, stats in self.tokens.items())
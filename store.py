@@ -0,0 +1,143 @@
+import os
+import json
+import sqlite3
+import threading
+
+from config import get_data_dir
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    address TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    transfer_key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (address, block_number, hash, transfer_key)
+);
+CREATE TABLE IF NOT EXISTS synced_ranges (
+    address TEXT NOT NULL,
+    start_block INTEGER NOT NULL,
+    end_block INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS synced_ranges_address ON synced_ranges (address);
+"""
+
+
+def get_transfer_key(transaction):
+    keys = ['contractAddress', 'from', 'to', 'value', 'transactionIndex']
+    return ':'.join([str(transaction.get(k, '')) for k in keys])
+
+
+# A transaction can move the same amount between the same two addresses more
+# than once, so repeats of a leg within a hash are numbered to keep them all.
+# The transactions must hold every transfer of their blocks.
+def get_transfer_keys(transactions):
+    counts = {}
+    keys = []
+    for tx in transactions:
+        key = get_transfer_key(tx)
+        count = counts.get((tx['hash'], key), 0)
+        counts[(tx['hash'], key)] = count + 1
+        keys.append(f"{key}#{count}" if count else key)
+    return keys
+
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def get_missing_ranges(ranges, start, end):
+    missing = []
+    current = start
+    for synced_start, synced_end in merge_ranges(ranges):
+        if synced_end < current:
+            continue
+        if synced_start > end:
+            break
+        if synced_start > current:
+            missing.append((current, synced_start - 1))
+        current = max(current, synced_end + 1)
+    if current <= end:
+        missing.append((current, end))
+    return missing
+
+
+class TransactionStore:
+    def __init__(self, path=None):
+        if not path:
+            path = os.path.join(get_data_dir(), 'transactions.db')
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.RLock()
+
+    def close(self):
+        self._connection.close()
+
+    def get_synced_ranges(self, address):
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT start_block, end_block FROM synced_ranges WHERE address = ?', (address.lower(),))
+            return merge_ranges(rows.fetchall())
+
+    def get_missing_ranges(self, address, start_block, end_block):
+        return get_missing_ranges(self.get_synced_ranges(address), start_block, end_block)
+
+    def get_last_synced_block(self, address):
+        ranges = self.get_synced_ranges(address)
+        if not ranges:
+            return None
+        return ranges[-1][1]
+
+    def add_transactions(self, address, transactions, start_block, end_block):
+        address = address.lower()
+        rows = [(address, int(tx['blockNumber']), tx['hash'], key, json.dumps(tx))
+            for tx, key in zip(transactions, get_transfer_keys(transactions))]
+        with self._lock, self._connection:
+            ranges = self.get_synced_ranges(address)
+            if start_block <= end_block:
+                ranges = merge_ranges(ranges + [(start_block, end_block)])
+            self._connection.executemany('INSERT OR IGNORE INTO transfers VALUES (?, ?, ?, ?, ?)', rows)
+            self._connection.execute('DELETE FROM synced_ranges WHERE address = ?', (address,))
+            self._connection.executemany('INSERT INTO synced_ranges VALUES (?, ?, ?)',
+                [(address, s, e) for s, e in ranges])
+
+    def get_transactions(self, address, start_block, end_block):
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT data FROM transfers WHERE address = ? AND block_number BETWEEN ? AND ? '
+                'ORDER BY block_number, rowid', (address.lower(), start_block, end_block)).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def iter_transactions(self, address, start_block, end_block, page_size=10000):
+        last_block, last_rowid = start_block - 1, -1
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    'SELECT block_number, rowid, data FROM transfers WHERE address = ? '
+                    'AND (block_number > ? OR (block_number = ? AND rowid > ?)) AND block_number <= ? '
+                    'ORDER BY block_number, rowid LIMIT ?',
+                    (address.lower(), last_block, last_block, last_rowid, end_block, page_size)).fetchall()
+            if not rows:
+                return
+            last_block, last_rowid, _ = rows[-1]
+            yield [json.loads(data) for *_, data in rows]
+            if len(rows) < page_size:
+                return
+
+    def remove_transactions(self, address, start_block, end_block):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM transfers WHERE address = ? AND block_number BETWEEN ? AND ?',
+                (address.lower(), start_block, end_block))
+
+    def clear(self, address):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM transfers WHERE address = ?', (address.lower(),))
+            self._connection.execute('DELETE FROM synced_ranges WHERE address = ?', (address.lower(),))
@@ -0,0 +1,87 @@
+import random
+
+
+BASE_TOKENS = [('WETH', 'Wrapped Ether', 18), ('USDC', 'USD Coin', 6), ('USDT', 'Tether USD', 6)]
+
+
+def random_address(rng):
+    return f"0x{rng.getrandbits(160):040x}"
+
+
+def random_hash(rng):
+    return f"0x{rng.getrandbits(256):064x}"
+
+
+def make_tokens(count, rng):
+    tokens = list(BASE_TOKENS[:count])
+    for i in range(len(tokens), count):
+        tokens.append((f"TKN{i}", f"Token {i}", rng.choice([6, 8, 9, 18, 18, 18])))
+    return [dict(symbol=s, name=n, decimals=d, contract=random_address(rng)) for s, n, d in tokens]
+
+
+def make_transfer(wallet, token, counterparty, outgoing, block, timestamp, tx_hash, index, rng):
+    value = rng.randrange(1, 10 ** rng.randint(2, 8)) * pow(10, token['decimals'])
+    return {
+        'blockNumber': str(block),
+        'timeStamp': str(timestamp),
+        'hash': tx_hash,
+        'nonce': str(rng.randrange(10000)),
+        'blockHash': f"0x{block:064x}",
+        'from': wallet if outgoing else counterparty,
+        'contractAddress': token['contract'],
+        'to': counterparty if outgoing else wallet,
+        'value': str(value // rng.randint(1, 1000)),
+        'tokenName': token['name'],
+        'tokenSymbol': token['symbol'],
+        'tokenDecimal': str(token['decimals']),
+        'transactionIndex': str(index),
+        'gas': str(rng.randrange(50000, 500000)),
+        'gasPrice': str(rng.randrange(10 ** 9, 10 ** 11)),
+        'gasUsed': str(rng.randrange(21000, 300000)),
+        'cumulativeGasUsed': str(rng.randrange(10 ** 5, 10 ** 7)),
+        'input': 'deprecated',
+        'confirmations': str(rng.randrange(1, 10 ** 6)),
+    }
+
+
+# Generates Etherscan tokentx-style rows for one wallet in block order.
+# swap_ratio of the hashes are two-leg swaps (one token out, another in),
+# multi_leg_ratio are routed swaps with three or more legs and the rest
+# are plain transfers.
+def generate_transfers(rows, tokens=20, counterparties=500, swap_ratio=0.6, multi_leg_ratio=0.0,
+        wallet=None, start_block=15000000, start_timestamp=1660000000, seed=0):
+    rng = random.Random(seed)
+    wallet = wallet or random_address(rng)
+    token_list = make_tokens(tokens, rng)
+    counterparty_list = [random_address(rng) for _ in range(counterparties)]
+    # Skewed token popularity, as real wallets trade a few tokens heavily.
+    weights = [1 / (i + 1) for i in range(len(token_list))]
+
+    transfers = []
+    block, timestamp = start_block, start_timestamp
+    while len(transfers) < rows:
+        block += rng.randint(1, 20)
+        timestamp += rng.randint(12, 240)
+        tx_hash = random_hash(rng)
+        kind = rng.random()
+        if kind < multi_leg_ratio:
+            legs = rng.randint(3, 4)
+        elif kind < multi_leg_ratio + swap_ratio:
+            legs = 2
+        else:
+            legs = 1
+
+        legs = min(legs, rows - len(transfers), len(token_list))
+        pool = counterparty_list[rng.randrange(len(counterparty_list))]
+        leg_tokens = []
+        while len(leg_tokens) < legs:
+            token = rng.choices(token_list, weights)[0]
+            if token not in leg_tokens:
+                leg_tokens.append(token)
+        for i, token in enumerate(leg_tokens):
+            if legs == 1:
+                outgoing = rng.random() < 0.5
+            else:
+                outgoing = i == 0
+            transfers.append(make_transfer(wallet, token, pool, outgoing, block, timestamp, tx_hash, i, rng))
+    return wallet, transfers
@@ -0,0 +1,31 @@
+import pytest
+
+from transactions import TransactionRange
+from test_ranges import WALLET, make_transfers, assert_statistics_equal
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.mark.parametrize('name', ['range.arrow', 'range.parquet'])
+def test_loaded_range_keeps_statistics_and_info(tmp_path, name):
+    transfers = make_transfers(600)
+    transaction_range = TransactionRange.from_transactions(WALLET, transfers, 1000, 1200)
+    path = str(tmp_path / name)
+    transaction_range.save(path)
+
+    loaded = TransactionRange.load(path)
+    assert len(loaded) == len(transfers)
+    assert loaded.get_info() == transaction_range.get_info()
+    assert loaded.get_statistics()
+    assert_statistics_equal(transaction_range.get_statistics(), loaded.get_statistics())
+
+
+def test_column_range_round_trips_without_info(tmp_path):
+    columns_range = TransactionRange.from_columns(
+        TransactionRange.from_transactions(WALLET, make_transfers(30), 1000, 1010).get_columns())
+    path = str(tmp_path / 'columns.arrow')
+    columns_range.save(path)
+    loaded = TransactionRange.load(path)
+    assert loaded.get_statistics()
+    with pytest.raises(ValueError):
+        loaded.get_info()
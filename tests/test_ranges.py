@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from columns import TransferColumns
+from transactions import TransactionRange
+
+
+WALLET = '0x00000000000000000000000000000000000000aa'
+
+
+def make_transfers(count, tokens=3, seed=0):
+    rng = random.Random(seed)
+    transfers = []
+    for i in range(count):
+        token = rng.randrange(tokens)
+        outgoing = rng.random() < 0.4
+        other = f"0x{rng.randrange(20):040x}"
+        transfers.append({'blockNumber': str(1000 + i // 3), 'timeStamp': str(1600000000 + i * 12),
+            'hash': f"0x{i // 2:064x}", 'from': WALLET if outgoing else other, 'to': other if outgoing else WALLET,
+            'contractAddress': f"0x{token:040x}", 'value': str(rng.randrange(1, 10 ** 20)),
+            'tokenName': f"Token {token}", 'tokenSymbol': f"T{token}", 'tokenDecimal': '18',
+            'transactionIndex': str(i % 7)})
+    return transfers
+
+
+def make_column_range(transfers):
+    return TransactionRange.from_columns(TransferColumns.from_transactions(WALLET, transfers))
+
+
+def assert_statistics_equal(expected, actual):
+    assert expected.keys() == actual.keys()
+    for token, stats in expected.items():
+        for key, value in stats.items():
+            if value is None:
+                assert actual[token][key] is None
+            else:
+                assert actual[token][key] == pytest.approx(value, rel=1e-9, abs=1e-12)
+
+
+def test_column_range_statistics_match_transactions():
+    transfers = make_transfers(600)
+    expected = TransactionRange.from_transactions(WALLET, transfers, 1000, 1200).get_statistics()
+    assert expected
+    assert_statistics_equal(expected, make_column_range(transfers).get_statistics())
+
+
+def test_column_range_statistics_flag_zero_balances():
+    transfers = make_transfers(3, tokens=1)
+    for i, transfer in enumerate(transfers):
+        transfer['value'] = str(10 ** 18)
+        transfer['from'], transfer['to'] = (WALLET, '0xother') if i == 1 else ('0xother', WALLET)
+    statistics = make_column_range(transfers).get_statistics()
+    assert statistics['T0']['trades'] == 3
+    assert statistics['T0']['variance'] is None
+
+
+def test_column_range_without_info_raises():
+    with pytest.raises(ValueError):
+        make_column_range(make_transfers(10)).get_info()
@@ -0,0 +1,117 @@
+import pytest
+
+import transactions
+from store import TransactionStore, get_transfer_keys
+
+
+WALLET = '0x00000000000000000000000000000000000000aa'
+
+
+def make_transfer(block, hash, value='1', index='0'):
+    return {'blockNumber': str(block), 'timeStamp': str(block), 'hash': hash, 'from': '0xsender',
+        'to': WALLET, 'contractAddress': '0xtoken', 'value': value, 'tokenSymbol': 'TOK',
+        'tokenDecimal': '0', 'transactionIndex': index}
+
+
+class FakeApi:
+    def __init__(self, transfers):
+        self.transfers = transfers
+        self.calls = []
+
+    def get_erc20_token_transfer_events_by_address(self, address, startblock, endblock, sort):
+        self.calls.append((startblock, endblock))
+        page = [tx for tx in self.transfers if startblock <= int(tx['blockNumber']) <= endblock]
+        if not page:
+            raise AssertionError('[] -- No transactions found')
+        return page[:transactions.ETHERSCAN_PAGE_SIZE]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = FakeApi([])
+    monkeypatch.setattr(transactions, 'ETHERSCAN_PAGE_SIZE', 4)
+    monkeypatch.setattr(transactions, 'get_etherscan_api', lambda: api)
+    monkeypatch.setattr(transactions, 'get_final_block', lambda: 100)
+    return api
+
+
+@pytest.fixture
+def store():
+    store = TransactionStore(':memory:')
+    yield store
+    store.close()
+
+
+def test_transfer_keys_number_repeated_legs():
+    legs = [make_transfer(1, 'a'), make_transfer(1, 'a'), make_transfer(1, 'b'), make_transfer(1, 'a', value='2')]
+    keys = get_transfer_keys(legs)
+    assert keys[1] == keys[0] + '#1'
+    assert keys[2] == keys[0]
+    assert len(set((tx['hash'], key) for tx, key in zip(legs, keys))) == 4
+
+
+def test_pages_hold_whole_blocks(api):
+    api.transfers = [make_transfer(1, 'a'), make_transfer(2, 'b'), make_transfer(3, 'c'),
+        make_transfer(3, 'c'), make_transfer(3, 'c'), make_transfer(4, 'd')]
+    pages = list(transactions.iter_address_transaction_pages(WALLET, 1, 10))
+    assert [[int(tx['blockNumber']) for tx in page] for page in pages] == [[1, 2], [3, 3, 3], [4]]
+    assert api.calls == [(1, 10), (3, 10), (4, 10)]
+
+
+def test_oversized_block_is_skipped(api):
+    api.transfers = [make_transfer(1, f"h{i}") for i in range(5)] + [make_transfer(2, 'b')]
+    pages = list(transactions.iter_address_transaction_pages(WALLET, 1, 10))
+    assert [len(page) for page in pages] == [4, 1]
+
+
+def test_empty_window(api):
+    assert list(transactions.iter_address_transaction_pages(WALLET, 1, 10)) == []
+
+
+def test_errors_are_not_empty(api, monkeypatch):
+    def fail(**kwargs):
+        raise AssertionError('Query Timeout occured -- NOTOK')
+    monkeypatch.setattr(api, 'get_erc20_token_transfer_events_by_address', fail)
+    with pytest.raises(AssertionError):
+        list(transactions.iter_address_transaction_pages(WALLET, 1, 10))
+
+
+def test_sync_keeps_repeated_legs_across_pages(api, store):
+    api.transfers = [make_transfer(1, 'a'), make_transfer(2, 'b'), make_transfer(2, 'b'),
+        make_transfer(3, 'c'), make_transfer(3, 'c'), make_transfer(3, 'c'), make_transfer(5, 'd')]
+    transactions.sync_address_transactions(WALLET, 1, 10, store)
+    assert len(store.get_transactions(WALLET, 1, 10)) == 7
+    assert store.get_synced_ranges(WALLET) == [(1, 10)]
+
+    transactions.sync_address_transactions(WALLET, 1, 10, store)
+    assert len(store.get_transactions(WALLET, 1, 10)) == 7
+
+
+def test_sync_refetches_unfinal_tail(api, store, monkeypatch):
+    monkeypatch.setattr(transactions, 'get_final_block', lambda: 6)
+    api.transfers = [make_transfer(block, f"h{block}") for block in range(1, 10)]
+    transactions.sync_address_transactions(WALLET, 1, 10, store)
+    assert store.get_synced_ranges(WALLET) == [(1, 6)]
+
+    # Block 8 was reorged away and a transfer landed in block 10.
+    api.transfers = [tx for tx in api.transfers if tx['blockNumber'] != '8'] + [make_transfer(10, 'h10')]
+    api.calls = []
+    transactions.sync_address_transactions(WALLET, 1, 10, store)
+    assert api.calls[0] == (7, 10)
+    blocks = [int(tx['blockNumber']) for tx in store.get_transactions(WALLET, 1, 10)]
+    assert blocks == [1, 2, 3, 4, 5, 6, 7, 9, 10]
+
+
+def test_failed_page_leaves_rest_of_gap_missing(api, store):
+    api.transfers = [make_transfer(block, f"h{block}") for block in range(1, 10)]
+    fetch = api.get_erc20_token_transfer_events_by_address
+
+    def flaky(**kwargs):
+        if api.calls:
+            api.calls.append((kwargs['startblock'], kwargs['endblock']))
+            raise AssertionError('Query Timeout occured -- NOTOK')
+        return fetch(**kwargs)
+    api.get_erc20_token_transfer_events_by_address = flaky
+    with pytest.raises(AssertionError):
+        transactions.sync_address_transactions(WALLET, 1, 10, store)
+    assert store.get_missing_ranges(WALLET, 1, 10) == [(4, 10)]
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+try:
+    import transport
+except Exception as e:
+    # requests-cache fails to import on some interpreter and cattrs pairings.
+    pytest.skip(f"transport unavailable: {e}", allow_module_level=True)
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def get_body(status, message, result):
+    return json.dumps({'status': status, 'message': message, 'result': result})
+
+
+@pytest.mark.parametrize('body, cacheable', [
+    (get_body('1', 'OK', [{'hash': '0x1'}]), True),
+    (get_body('1', 'OK', '16000000'), True),
+    (get_body('0', 'No transactions found', []), True),
+    (get_body('0', 'NOTOK', 'Query Timeout occured. Please select a smaller result dataset'), False),
+    (get_body('0', 'NOTOK', 'Invalid API Key'), False),
+    (get_body('0', 'NOTOK', 'Max rate limit reached'), False),
+    ('<html>Bad Gateway</html>', False),
+])
+def test_only_successful_etherscan_results_are_cached(body, cacheable):
+    assert transport.is_etherscan_cacheable(FakeResponse(body)) == cacheable
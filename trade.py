@@ -1,4 +1,5 @@
 import time
+import weakref
 
 class Trade:
     def __init__(self, transactions):
@@ -8,71 +9,116 @@ class Trade:
         return dict([])
 
 
+class TokenReport:
+    def __init__(self, token, long_volume, short_volume, long_count, short_count):
+        self.token = token
+        self.long_volume = long_volume
+        self.short_volume = short_volume
+        self.long_count = long_count
+        self.short_count = short_count
+
+    @property
+    def net_volume(self):
+        return self.long_volume + self.short_volume
+
+    @property
+    def total_volume(self):
+        return self.long_volume - self.short_volume
+
+    @property
+    def is_long_only(self):
+        return self.long_volume > 0 and self.short_volume == 0
+
+    @property
+    def is_short_only(self):
+        return self.long_volume == 0 and self.short_volume < 0
+
+    @property
+    def is_net_long(self):
+        return self.long_volume > abs(self.short_volume)
+
+    @property
+    def is_net_short(self):
+        return self.long_volume < abs(self.short_volume)
+
+    @property
+    def direction(self):
+        if self.is_net_long:
+            return 'long'
+        elif self.is_net_short:
+            return 'short'
+        return 'flat'
+
+    @property
+    def long_short_percentages(self):
+        long_perentage = self.long_volume / self.total_volume
+        return long_perentage, 1 - long_perentage
+
+    def to_dict(self):
+        try:
+            long_percentage, short_percentage = self.long_short_percentages
+        except ZeroDivisionError:
+            long_percentage, short_percentage = None, None
+        return dict(long_volume=self.long_volume, short_volume=self.short_volume,
+            long_count=self.long_count, short_count=self.short_count, net_volume=self.net_volume,
+            direction=self.direction, long_only=self.is_long_only, short_only=self.is_short_only,
+            long_percentage=long_percentage, short_percentage=short_percentage)
+
+
+# Reports are kept per range so the helpers below share a single pass.
+portfolio_reports = weakref.WeakKeyDictionary()
+
+
+def get_portfolio_report(transaction_range):
+    report = portfolio_reports.get(transaction_range)
+    if report is None:
+        report = dict((token, TokenReport(token, *volumes))
+            for token, volumes in transaction_range.get_long_short_volumes().items())
+        portfolio_reports[transaction_range] = report
+    return report
+
+
+def get_token_report(transaction_range, token):
+    report = get_portfolio_report(transaction_range)
+    return report.get(token) or TokenReport(token, 0, 0, 0, 0)
+
+
 def get_trade_volumes(transaction_range, token):
-    long_volume, short_volume = 0, 0
-    for (_, _, value) in transaction_range.get_token_trades(token):
-        if value > 0:
-            long_volume += value
-        else:
-            short_volume += value
-    return long_volume, short_volume
+    report = get_token_report(transaction_range, token)
+    return report.long_volume, report.short_volume
 
 
 def is_long_only(transaction_range, token):
-    long_volume, short_volume = get_trade_volumes(transaction_range, token)
-    return long_volume > 0 and short_volume == 0
+    return get_token_report(transaction_range, token).is_long_only
 
 
 def is_short_only(transaction_range, token):
-    long_volume, short_volume = get_trade_volumes(transaction_range, token)
-    return long_volume == 0 and short_volume < 0
+    return get_token_report(transaction_range, token).is_short_only
 
 
 def is_net_long(transaction_range, token):
-    long_volume, short_volume = get_trade_volumes(transaction_range, token)
-    return long_volume > abs(short_volume)
+    return get_token_report(transaction_range, token).is_net_long
 
 
 def is_net_short(transaction_range, token):
-    long_volume, short_volume = get_trade_volumes(transaction_range, token)
-    return long_volume < abs(short_volume)
+    return get_token_report(transaction_range, token).is_net_short
 
 
 def get_long_short_percentages(transaction_range, token):
-    long_volume, short_volume = get_trade_volumes(transaction_range, token)
-    total_volume = long_volume - short_volume
-    long_perentage = long_volume / total_volume
-    return long_perentage, 1 - long_perentage
+    return get_token_report(transaction_range, token).long_short_percentages
 
 
 def get_long_only_tokens(transaction_range):
-    tokens = []
-    for token in transaction_range.get_token_info().keys():
-        if is_long_only(transaction_range, token):
-            tokens.append(token)
-    return tokens
+    return [t for t, r in get_portfolio_report(transaction_range).items() if r.is_long_only]
 
 
 def get_short_only_tokens(transaction_range):
-    tokens = []
-    for token in transaction_range.get_token_info().keys():
-        if is_short_only(transaction_range, token):
-            tokens.append(token)
-    return tokens
+    return [t for t, r in get_portfolio_report(transaction_range).items() if r.is_short_only]
 
 
 def get_net_long_tokens(transaction_range):
-    tokens = []
-    for token in transaction_range.get_token_info().keys():
-        if is_net_long(transaction_range, token):
-            tokens.append(token)
-    return tokens
+    return [t for t, r in get_portfolio_report(transaction_range).items() if r.is_net_long]
 
 
 def get_net_short_tokens(transaction_range):
-    tokens = []
-    for token in transaction_range.get_token_info().keys():
-        if is_net_short(transaction_range, token):
-            tokens.append(token)
-    return tokens
-
+    return [t for t, r in get_portfolio_report(transaction_range).items() if r.is_net_short]
@@ -1,67 +1,314 @@
+import sys
 import time
+import queue
+import threading
 import pprint
 import math
 from operator import itemgetter
 from datetime import datetime, timedelta
+from decimal import Decimal
 from json import JSONDecodeError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from config import get_etherscan_api_key
-from etherscan import Etherscan
+from config import get_etherscan_api_key, get_etherscan_rate_limit, get_block_tolerance, get_balance_ttl
 from dataclasses import dataclass
 
 from options import *
-
-etherscan_api_key = get_etherscan_api_key()
-etherscan_api = Etherscan(etherscan_api_key)
+from store import TransactionStore
+from columns import TransferColumns, TimeIndex
+from ratelimit import RateLimiter
+from blocks import BlockIndex
+from addressbook import get_address_book
+from stats import TransactionStatistics
+from units import get_decimal_scale, convert_token_value
+from metrics import timed, increment, observe
+
+etherscan_api = None
+etherscan_limiter = None
+etherscan_lock = threading.Lock()
+transaction_store = None
+transaction_store_lock = threading.Lock()
+block_index = None
+block_index_lock = threading.Lock()
+balance_cache = {}
+balance_cache_lock = threading.Lock()
+final_block = None
+final_block_lock = threading.Lock()
+
+# Block lookups this close to the present may still change as new blocks
+# are indexed, so they are not cached.
+BLOCK_FINALITY_SECONDS = 60
+
+# Transfers in blocks newer than this may not be indexed by Etherscan yet or
+# may still be reorged, so those blocks are never recorded as synced.
+SYNC_FINALITY_SECONDS = 10 * 60
+
+
+def get_etherscan_api():
+    global etherscan_api
+    limiter = get_etherscan_limiter()
+    with etherscan_lock:
+        if etherscan_api is None:
+            from transport import EtherscanTransport, make_etherscan_client
+            # Routing the client through the shared transport gives it
+            # pooling, caching and retries.
+            etherscan_api = make_etherscan_client(get_etherscan_api_key(), EtherscanTransport(limiter))
+    return etherscan_api
+
+
+def get_etherscan_limiter():
+    global etherscan_limiter
+    with etherscan_lock:
+        if etherscan_limiter is None:
+            etherscan_limiter = RateLimiter(get_etherscan_rate_limit())
+    return etherscan_limiter
 
 
 def get_alias_address(alias, path):
-    with open(path, 'r') as f:
-        for line in f.readlines():
-            try:
-                _alias, address = line.split(',')
-                if alias == _alias:
-                    return address.strip()
-            except ValueError:
-                continue
+    return get_address_book(path).get_address(alias)
+
+
+def get_address_alias(address, path):
+    return get_address_book(path).get_alias(address)
+
+
+def get_alias_addresses(path):
+    return get_address_book(path).items()
+
+
+def get_block_index():
+    global block_index
+    with block_index_lock:
+        if block_index is None:
+            block_index = BlockIndex(tolerance=get_block_tolerance())
+    return block_index
 
 
 def get_timestamp_block_number(timestamp):
-    return etherscan_api.get_block_number_by_timestamp(timestamp=timestamp, closest='before')
+    index = get_block_index()
+    block = index.lookup(timestamp)
+    if block is None:
+        block = int(get_etherscan_api().get_block_number_by_timestamp(timestamp=timestamp, closest='before'))
+        if timestamp < time.time() - BLOCK_FINALITY_SECONDS:
+            index.add(timestamp, block)
+    return block
 
 
-def convert_token_value(value, decimal):
-    return int(value) * pow(10, -1 * int(decimal))
+def get_final_block(ttl=60):
+    global final_block
+    with final_block_lock:
+        if final_block is None or time.time() - final_block[0] > ttl:
+            final_block = (time.time(), get_timestamp_block_number(round(time.time()) - SYNC_FINALITY_SECONDS))
+        return final_block[1]
 
 
 def get_address_token_balance(contract_address, wallet_address):
-    return int(etherscan_api.get_acc_balance_by_token_and_contract_address(contract_address=contract_address,
+    return int(get_etherscan_api().get_acc_balance_by_token_and_contract_address(contract_address=contract_address,
         address=wallet_address))
 
 
-def get_address_transactions(address, start, end):
+# tokenbalance only ever returns the balance at the chain head, so this is a
+# current balance cached for a few seconds, not a snapshot at any block.
+def get_current_token_balance(contract_address, wallet_address, ttl=None):
+    if ttl is None:
+        ttl = get_balance_ttl()
+    key = (contract_address.lower(), wallet_address.lower())
+    with balance_cache_lock:
+        cached = balance_cache.get(key)
+    if cached and time.time() - cached[0] <= ttl:
+        return cached[1]
+    balance = get_address_token_balance(contract_address, wallet_address)
+    with balance_cache_lock:
+        balance_cache[key] = (time.time(), balance)
+    return balance
+
+
+def get_token_balances(wallet_address, info, tokens=None, max_workers=8):
+    if tokens is None:
+        tokens = list(info.keys())
+    balances = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = dict((executor.submit(get_current_token_balance, info[token]['contractAddress'],
+            wallet_address), token) for token in tokens)
+        for future in as_completed(futures):
+            token = futures[future]
+            balances[token] = convert_token_value(future.result(), info[token]['tokenDecimal'])
+    return balances
+
+
+ETHERSCAN_PAGE_SIZE = 10000
+
+
+# Etherscan reports every failure, including an empty window, as a NOTOK
+# response, which the client raises as an AssertionError.
+def is_empty_result(error):
+    return 'No transactions found' in str(error)
+
+
+def iter_address_transaction_pages(address, startblock, endblock):
+    while True:
+        try:
+            transactions = get_etherscan_api().get_erc20_token_transfer_events_by_address(address=address,
+                startblock=startblock, endblock=endblock, sort='asc')
+        except AssertionError as e:
+            # Timeouts, bad keys and the like must not pass for an empty
+            # window, or the caller would mark the gap as synced.
+            if is_empty_result(e):
+                return
+            raise
+
+        increment('etherscan_pages_total')
+        if len(transactions) != ETHERSCAN_PAGE_SIZE:
+            yield transactions
+            return
+
+        lastblock = int(transactions[-1]['blockNumber'])
+        if lastblock == startblock:
+            print(f"Block {lastblock} has more than {ETHERSCAN_PAGE_SIZE} transfers, skipping the rest")
+            yield transactions
+            startblock = lastblock + 1
+            continue
+        # The last block may continue on the next page, so its rows are held
+        # back and fetched again whole. Every page then holds complete blocks,
+        # which keeps repeated identical legs countable.
+        page = [tx for tx in transactions if int(tx['blockNumber']) < lastblock]
+        if page:
+            yield page
+        startblock = lastblock
+
+
+def prefetch(iterable, size=1):
+    items = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stopped.is_set():
+                    try:
+                        items.put((item, None), timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+                if stopped.is_set():
+                    return
+            items.put((done, None))
+        except Exception as e:
+            items.put((done, e))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+def fetch_address_transactions(address, startblock, endblock):
+    all_transactions = []
+    for page in iter_address_transaction_pages(address, startblock, endblock):
+        all_transactions += page
+    return all_transactions
+
+
+def get_transaction_store():
+    global transaction_store
+    with transaction_store_lock:
+        if transaction_store is None:
+            transaction_store = TransactionStore()
+    return transaction_store
+
+
+def sync_address_transactions(address, startblock, endblock, store=None):
+    store = store or get_transaction_store()
+    final = min(endblock, get_final_block())
+    pages = 0
+    for gap_start, gap_end in store.get_missing_ranges(address, startblock, endblock):
+        # Rows left in a gap come from an earlier pass over the unfinal tail
+        # and may have been reorged away, so the gap is fetched from scratch.
+        store.remove_transactions(address, gap_start, gap_end)
+        for page in prefetch(iter_address_transaction_pages(address, gap_start, gap_end)):
+            store.add_transactions(address, page, gap_start, min(int(page[-1]['blockNumber']), final))
+            pages += 1
+        # Only reached once pagination finished; a failed page raises above
+        # and leaves the rest of the gap missing. Blocks past the final one
+        # stay missing too, so the next sync fetches them again.
+        store.add_transactions(address, [], gap_start, min(gap_end, final))
+    observe('transfer_pages_per_sync', pages)
+    return store
+
+
+@timed('get_address_transactions_seconds')
+def get_address_transactions(address, start, end, use_store=True):
     try:
         print(f"Start: {start}, End: {end}")
-        startblock = get_timestamp_block_number(start)
-        endblock = get_timestamp_block_number(end)
-        all_transactions = []
-        finished = False
+        startblock = int(get_timestamp_block_number(start))
+        endblock = int(get_timestamp_block_number(end))
+        return get_address_block_transactions(address, startblock, endblock, use_store)
+    except AssertionError:
+        return []
 
-        while not finished:
-            transactions = etherscan_api.get_erc20_token_transfer_events_by_address(address=address,
-                startblock=startblock, endblock=endblock, sort='asc')
-            all_transactions += transactions
-            lastblock = transactions[-1]['blockNumber']
-            if len(transactions) != 10000:
-                finished = True
-            else:
-                startblock = lastblock
 
-        return all_transactions
+def get_address_block_transactions(address, startblock, endblock, use_store=True):
+    if not use_store:
+        return fetch_address_transactions(address, startblock, endblock)
+    store = sync_address_transactions(address, startblock, endblock)
+    return store.get_transactions(address, startblock, endblock)
+
+
+def iter_address_block_transactions(address, startblock, endblock, use_store=True):
+    if not use_store:
+        yield from prefetch(iter_address_transaction_pages(address, startblock, endblock))
+        return
+    store = sync_address_transactions(address, startblock, endblock)
+    yield from store.iter_transactions(address, startblock, endblock, ETHERSCAN_PAGE_SIZE)
+
+
+def get_address_volumes(address, startblock, endblock, use_store=True):
+    volumes = {}
+    for page in iter_address_block_transactions(address, startblock, endblock, use_store):
+        for tx in page:
+            trade = get_trade_from_transaction(tx, address)
+            if trade:
+                _, symbol, value = trade
+                volumes[symbol] = volumes.get(symbol, 0) + value
+    return volumes
+
+
+def get_addresses_transactions(addresses, start, end, max_workers=8, use_store=True):
+    try:
+        startblock = int(get_timestamp_block_number(start))
+        endblock = int(get_timestamp_block_number(end))
     except AssertionError:
-        return []
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = dict((executor.submit(get_address_block_transactions, address, startblock, endblock,
+            use_store), address) for address in addresses)
+        for future in as_completed(futures):
+            address = futures[future]
+            try:
+                yield address, future.result()
+            except Exception as e:
+                print(f"Failed to fetch {address}: {e}")
 
 
+def index_transactions(transactions, key):
+    index = {}
+    for tx in transactions:
+        k = tx[key]
+        if index.get(k):
+            index[k].append(tx)
+        else:
+            index[k] = [tx]
+    return index
+
 
 def get_trade_from_transaction(transaction, wallet_address, readable_timestamp=True):
     try:
@@ -86,23 +333,30 @@ class Transactions:
         self.address = address
         self.transactions = transactions
         self._created_at = datetime.fromtimestamp(round(time.time()))
+        self._hash_index = None
+        self._symbol_index = None
         
     def __len__(self):
         return len(self.transactions)
 
     def __dict__(self):
-        table = {}
-        for tx in self.transactions:
-            h = tx['hash']
-            if table.get(h):
-                table[h].append(tx)
-            else:
-                table[h] = [tx]
-        return table
+        return self.hash_index
+
+    @property
+    def hash_index(self):
+        if self._hash_index is None:
+            self._hash_index = index_transactions(self.transactions, 'hash')
+        return self._hash_index
+
+    @property
+    def symbol_index(self):
+        if self._symbol_index is None:
+            self._symbol_index = index_transactions(self.transactions, 'tokenSymbol')
+        return self._symbol_index
 
     @property
     def token_list(self):
-        return set([t['tokenSymbol'] for t in self.transactions])
+        return set(self.symbol_index.keys())
 
     @property
     def non_base_list(self):
@@ -128,44 +382,39 @@ class Transactions:
     def all_addresses(self):
         return self.in_addresses.union(self.out_addresses)
 
-    def get_token_transactions(self, symbol):
-        return [t for t in self.transactions if t['tokenSymbol'] == symbol]
+    def save(self, path):
+        from archive import save_columns
+        save_columns(TransferColumns.from_transactions(self.address, self.transactions), path)
 
+    def label_addresses(self, book, addresses=None):
+        if addresses is None:
+            addresses = self.all_addresses
+        return book.label(addresses)
+
+    def get_token_transactions(self, symbol):
+        return list(self.symbol_index.get(symbol, []))
+
+    def get_token_hashes(self, token):
+        return list(dict.fromkeys([t['hash'] for t in self.symbol_index.get(token, [])]))
+
+    def get_hash_trade(self, h, token):
+        txs = self.hash_index[h]
+        if len(txs) == 1:
+            return Transfer(self.address, txs[0])
+        elif len(txs) == 2:
+            from_tx, to_tx = txs
+            if to_tx['from'] == self.address:
+                to_tx, from_tx = from_tx, to_tx
+            return Trade(self.address, token, from_tx, to_tx)
+        else:
+            raise Exception(f"More than 2 matches for hash {h}")
 
     def get_token_trades2(self, token):
-        for h in set([t['hash'] for t in self.get_token_transactions(token)]):
-            txs = self.__dict__()[h]
-            if len(txs) == 1:
-                yield Transfer(self.address, txs[0])
-            elif len(txs) == 2:
-                from_tx, to_tx = txs
-                if to_tx['from'] == self.address:
-                    to_tx, from_tx = from_tx, to_tx
-                yield Trade(self.address, token, from_tx, to_tx)
-            else:
-                raise Exception(f"More than 2 matches for hash {h}")
+        yield from self.get_token_trades(token)
         
     def get_token_trades(self, token):
-        trade_hashes = set([tx['hash'] for tx in self.get_token_transactions(token)])
-        table = {}
-        for tx in self.transactions:
-            current_hash = tx['hash']
-            if current_hash in trade_hashes:
-                if table.get(current_hash):
-                    table[current_hash].append(tx)
-                else:
-                    table[current_hash] = [tx]
-        for h, txs in table.items():
-            if len(txs) == 1:
-                tx = txs[0]
-                yield Transfer(self.address, tx)
-            elif len(txs) == 2:
-                from_tx, to_tx = txs
-                if to_tx['from'] == self.address:
-                    to_tx, from_tx = from_tx, to_tx
-                yield Trade(self.address, token, from_tx, to_tx)
-            else:
-                raise Exception(f"More than 2 matches for hash {h}")
+        for h in self.get_token_hashes(token):
+            yield self.get_hash_trade(h, token)
 
     @classmethod
     def get_from_timestamps(cls, address, start, end=None):
@@ -175,24 +424,34 @@ class Transactions:
 
 
 class Transfer:
+    __slots__ = ('address', 'token', 'hash', 'block', 'epoch', 'raw_value', 'decimals', 'outgoing', 'value')
+
     def __init__(self, address, transaction):
         self.address = address
-        self.transaction = transaction
+        self.token = sys.intern(transaction['tokenSymbol'])
+        self.hash = transaction['hash']
+        self.block = int(transaction['blockNumber'])
+        self.epoch = int(transaction['timeStamp'])
+        self.raw_value = int(transaction['value'])
+        self.decimals = int(transaction['tokenDecimal'])
+        self.outgoing = transaction['from'] == address
+        self.value = self.amount / get_decimal_scale(self.decimals)
+
+    @classmethod
+    def from_transactions(cls, address, transactions):
+        return [cls(address, tx) for tx in transactions]
 
     @property
-    def timestamp(self):
-        return datetime.fromtimestamp(int(self.transaction['timeStamp']))
+    def amount(self):
+        return -self.raw_value if self.outgoing else self.raw_value
 
     @property
-    def value(self):
-        value = int(self.transaction['value'])
-        value *= -1 if self.transaction['from'] == self.address else 1
-        value *= pow(10, -int(self.transaction['tokenDecimal'])) 
-        return value
+    def exact_value(self):
+        return Decimal(self.amount).scaleb(-self.decimals)
 
     @property
-    def token(self):
-        return self.transaction['tokenSymbol']
+    def timestamp(self):
+        return datetime.fromtimestamp(self.epoch)
 
     def __str__(self):
         return f"{self.timestamp}: {self.value} ${self.token}"
@@ -214,31 +473,33 @@ class _Trade:
 # as two transactions
 
 class Trade:
+    __slots__ = ('address', 'symbol', 'from_transfer', 'to_transfer')
+
     def __init__(self, address, symbol, from_tx, to_tx):
         self.address = address
         self.symbol = symbol
-        self.from_tx = from_tx
-        self.to_tx = to_tx
+        self.from_transfer = from_tx if isinstance(from_tx, Transfer) else Transfer(address, from_tx)
+        self.to_transfer = to_tx if isinstance(to_tx, Transfer) else Transfer(address, to_tx)
 
     @property
     def timestamp(self):
-        return datetime.fromtimestamp(int(self.from_tx['timeStamp']))
+        return self.from_transfer.timestamp
 
     @property
     def from_token(self):
-        return self.from_tx['tokenSymbol']
+        return self.from_transfer.token
 
     @property
     def to_token(self):
-        return self.to_tx['tokenSymbol']
+        return self.to_transfer.token
 
     @property
     def from_value(self):
-        return -int(self.from_tx['value']) * pow(10, -int(self.from_tx['tokenDecimal']))
+        return -abs(self.from_transfer.value)
 
     @property
     def to_value(self):
-        return int(self.to_tx['value']) * pow(10, -int(self.to_tx['tokenDecimal']))
+        return abs(self.to_transfer.value)
 
     @property
     def from_string(self):
@@ -253,9 +514,9 @@ class Trade:
 
 
 def trade_is_consistent(trade):
-    hashes_equal = trade.from_tx['hash'] == trade.to_tx['hash']
-    blocks_equal = trade.from_tx['blockNumber'] == trade.to_tx['blockNumber']
-    time_equal = trade.from_tx['timeStamp'] == trade.to_tx['timeStamp']
+    hashes_equal = trade.from_transfer.hash == trade.to_transfer.hash
+    blocks_equal = trade.from_transfer.block == trade.to_transfer.block
+    time_equal = trade.from_transfer.epoch == trade.to_transfer.epoch
     return hashes_equal and blocks_equal and time_equal
 
 
@@ -272,7 +533,7 @@ def get_trade_volume(trades, token):
 
 class TransactionRange:
 
-    def __init__(self, address, start_block=None, end_block=None):
+    def __init__(self, address, start_block=None, end_block=None, columnar=False):
         if not start_block:
             start_block = get_timestamp_for_range(TransactionRangeOptions.DAY)
 
@@ -282,36 +543,143 @@ class TransactionRange:
         self.address = address
         self.start_block = start_block
         self.end_block = end_block
-        self._transactions = get_address_transactions(address, start_block, end_block)
+        self._load_transactions()
+        self._timestamp = datetime.fromtimestamp(round(time.time()))
+        self._info = None
+        self._statistics = None
+        self._time_index = None
+        self._columns = TransferColumns.from_transactions(address, self._transactions) if columnar else None
+
+
+    @classmethod
+    def from_columns(cls, columns, start_block_number=None, end_block_number=None):
+        self = cls.from_transactions(columns.address, [], start_block_number, end_block_number)
+        self._columns = columns
+        if len(columns):
+            self.start_block = int(columns.timestamps.min())
+            self.end_block = int(columns.timestamps.max())
+            if start_block_number is None:
+                self.start_block_number = int(columns.blocks.min())
+            if end_block_number is None:
+                self.end_block_number = int(columns.blocks.max())
+        return self
+
+
+    # Reloads as a columnar range; IPC archives are memory-mapped rather than
+    # read, so opening a large history does not copy it.
+    @classmethod
+    def load(cls, path, memory_map=True):
+        from archive import load_columns
+        columns, metadata = load_columns(path, memory_map)
+        self = cls.from_columns(columns, metadata.get('start_block_number'), metadata.get('end_block_number'))
+        self._info = metadata.get('info')
+        return self
+
+
+    def save(self, path):
+        from archive import save_columns
+        info = self.get_info() if self._transactions else self._info
+        save_columns(self.get_columns(), path, dict(info=info,
+            start_block_number=self.start_block_number, end_block_number=self.end_block_number))
+
+
+    @classmethod
+    def for_ranges(cls, address, options=STANDARD_RANGES, fromdate=None, columnar=False):
+        # Loads the widest window once; the narrower ones are read from the
+        # time index instead of being fetched again.
+        timestamps = get_timestamps_for_ranges(options, fromdate)
+        return cls(address, start_block=min(timestamps.values()), columnar=columnar)
+
+
+    @classmethod
+    def from_transactions(cls, address, transactions, start_block_number, end_block_number, columnar=False):
+        self = cls.__new__(cls)
+        self.address = address
+        self.start_block = self.end_block = None
+        self.start_block_number = start_block_number
+        self.end_block_number = end_block_number
+        self._transactions = transactions
         self._timestamp = datetime.fromtimestamp(round(time.time()))
+        self._info = None
+        self._statistics = None
+        self._time_index = None
+        self._columns = TransferColumns.from_transactions(address, transactions) if columnar else None
+        if transactions:
+            self.start_block = int(transactions[0]['timeStamp'])
+            self.end_block = int(transactions[-1]['timeStamp'])
+        return self
 
 
 # TODO: Compute start and end
 
+    @timed('transaction_range_seconds', method='load')
+    def _load_transactions(self):
+        try:
+            print(f"Start: {self.start_block}, End: {self.end_block}")
+            self.start_block_number = get_timestamp_block_number(self.start_block)
+            self.end_block_number = get_timestamp_block_number(self.end_block)
+            self._transactions = get_address_block_transactions(self.address, self.start_block_number,
+                self.end_block_number)
+        except AssertionError:
+            self.start_block_number = self.end_block_number = None
+            self._transactions = []
+
     def __len__(self):
+        if self._columns is not None:
+            return len(self._columns)
         return len(self._transactions)
 
 
+    def get_columns(self):
+        if self._columns is None:
+            return TransferColumns.from_transactions(self.address, self._transactions)
+        return self._columns
+
+
+    def get_counterparties(self):
+        if self._columns is not None:
+            return list(self._columns.counterparties)
+        return list(dict.fromkeys([tx['to'] if tx['from'] == self.address else tx['from']
+            for tx in self._transactions]))
+
+
+    def label_counterparties(self, book):
+        return book.label(self.get_counterparties())
+
+
     @property
     def token_list(self):
+        if self._columns is not None:
+            return list(self._columns.tokens)
         return list(self.get_info().keys())
 
 
     def get_info(self):
+        if self._info is not None:
+            return self._info
+        # Token names, decimals and contracts are not kept in the columns.
+        if self._columns is not None and len(self._columns) and not self._transactions:
+            raise ValueError(f"No token info for {self.address}: the range was built from columns without it")
         info = {}
         for tx in self._transactions:
             symbol = tx['tokenSymbol']
             if not info.get(symbol):
                 info[symbol] = dict((k, v) for k, v in tx.items()
                     if k in ['tokenName', 'tokenDecimal', 'contractAddress'])
+        self._info = info
         return info
 
 
-    # Questionable. Introduces stale state.
+    # Current balances, not balances at end_block_number: Etherscan's
+    # tokenbalance only reports the chain head. They match the range end only
+    # when the range runs to the present.
     def get_balance(self, token):
-        balance = get_address_token_balance(self.get_info()[token]['contractAddress'], self.address)
-        balance = convert_token_value(balance, self.get_info()[token]['tokenDecimal']) 
-        return balance
+        return self.get_balances([token])[token]
+
+
+    @timed('transaction_range_seconds', method='get_balances')
+    def get_balances(self, tokens=None):
+        return get_token_balances(self.address, self.get_info(), tokens)
 
 
     def get_transactions_for_token(self, token):
@@ -321,6 +689,8 @@ class TransactionRange:
 # Possibly create new trades object
 
     def get_trades(self, token, include_hash=False, readable_timestamp=True):
+        if self._columns is not None:
+            return self._columns.get_trades(token, include_hash, readable_timestamp)
         trades = []
         for tx in filter(lambda tx: tx['tokenSymbol'] == token, self._transactions):
             trade = get_trade_from_transaction(tx, self.address, readable_timestamp)
@@ -332,13 +702,17 @@ class TransactionRange:
 
 
     def get_volume(self, token):
+        if self._columns is not None:
+            return self._columns.get_volume(token)
         return sum([volume for _, _, volume in self.get_trades(token)])
 
 
-    def get_balance_change(self, token):
-        try:
+    def get_balance_change(self, token, balance=None, volume=None):
+        if balance is None:
             balance = self.get_balance(token)
+        if volume is None:
             volume = self.get_volume(token)
+        try:
             if volume >= 0:
                 change =  volume / (balance - volume)
             else:
@@ -349,20 +723,44 @@ class TransactionRange:
         return change * 100
 
     
+    @timed('transaction_range_seconds', method='get_balance_changes')
     def get_balance_changes(self, tokens):
+        balances = self.get_balances(tokens)
+        volumes = self.get_volumes()
         changes = {}
         for token in tokens:
-            changes[token] = self.get_balance_change(token)
+            changes[token] = self.get_balance_change(token, balances[token], volumes.get(token, 0))
         return changes
 
 
+    @timed('transaction_range_seconds', method='get_volumes')
     def get_volumes(self):
+        if self._columns is not None:
+            return self._columns.get_volumes()
         volumes = {}
         for token in self.token_list:
             volumes[token] = self.get_volume(token)
         return volumes
 
 
+    def get_long_short_volumes(self):
+        if self._columns is not None:
+            return self._columns.get_long_short_volumes()
+        volumes = dict((token, [0, 0, 0, 0]) for token in self.token_list)
+        for tx in self._transactions:
+            trade = get_trade_from_transaction(tx, self.address, readable_timestamp=False)
+            if not trade:
+                continue
+            _, symbol, value = trade
+            if value > 0:
+                volumes[symbol][0] += value
+                volumes[symbol][2] += 1
+            else:
+                volumes[symbol][1] += value
+                volumes[symbol][3] += 1
+        return dict((token, tuple(v)) for token, v in volumes.items())
+
+
     def get_positive_volumes(self):
         return dict([(k, v) for k, v in self.get_volumes().items() if v > 0])
 
@@ -380,14 +778,21 @@ class TransactionRange:
 
 
     def is_long_only(self, token):
+        if self._columns is not None:
+            return self._columns.is_long_only(token)
         return all([(True if volume > 0 else False) for _, _, volume in self.get_trades(token)])
 
 
     def is_short_only(self, token):
+        if self._columns is not None:
+            return self._columns.is_short_only(token)
         return all([(True if volume < 0 else False) for _, _, volume in self.get_trades(token)])
 
     # __dict__
+    @timed('transaction_range_seconds', method='get_trade_table')
     def get_trade_table(self):
+        if self._columns is not None:
+            return self._columns.get_trade_table()
         table = {}
         for token in self.token_list:
             for _ in self.get_trades(token, include_hash=True):
@@ -399,6 +804,9 @@ class TransactionRange:
         return table
    
     def get_cumulative_balances(self, token):
+        if self._columns is not None:
+            yield from self._columns.get_cumulative_balances(token)
+            return
         trades = self.get_trades(token)
         balance = 0
         for trade in trades:
@@ -407,6 +815,9 @@ class TransactionRange:
             yield trade + (balance,)
 
     def get_trade_balance_changes(self, token):
+        if self._columns is not None:
+            yield from self._columns.get_trade_balance_changes(token).tolist()
+            return
         balances = self.get_cumulative_balances(token)
         try:
             *_, initial_balance = next(balances)
@@ -418,17 +829,75 @@ class TransactionRange:
             yield change
 
 
+    def get_time_index(self):
+        if self._time_index is None:
+            self._time_index = TimeIndex(self.get_columns())
+        return self._time_index
+
+
+    def get_window(self, start=None, end=None):
+        return self.get_time_index().get_window(start, end)
+
+
+    def get_window_volumes(self, start=None, end=None):
+        return self.get_time_index().get_volumes(start, end)
+
+
+    # Balances at the end of a window, walked back from the current balance
+    # by the volume that moved after it; exact when the range runs to the
+    # present.
+    def get_window_balances(self, end=None, tokens=None, balances=None):
+        if balances is None:
+            balances = self.get_balances(tokens)
+        if end is None:
+            return dict(balances)
+        index = self.get_time_index()
+        return dict((token, balance - index.get_volume_after(token, end)) for token, balance in balances.items())
+
+
+    @timed('transaction_range_seconds', method='get_rollups')
+    def get_rollups(self, options=STANDARD_RANGES, fromdate=None, tokens=None, include_balances=True):
+        timestamps = get_timestamps_for_ranges(options, fromdate)
+        if tokens is None:
+            tokens = self.token_list
+        balances = self.get_balances(tokens) if include_balances else None
+        rollups = {}
+        for option, start in timestamps.items():
+            window = self.get_window(start)
+            rollup = {
+                'start': start,
+                'volumes': dict((token, window[token][0]) for token in tokens if token in window),
+                'counts': dict((token, window[token][3] + window[token][4]) for token in tokens if token in window),
+            }
+            if balances is not None:
+                rollup['balances'] = dict(balances)
+                rollup['balance_changes'] = dict((token, self.get_balance_change(token, balances[token],
+                    rollup['volumes'].get(token, 0))) for token in tokens)
+            rollups[option.name] = rollup
+        return rollups
+
+
+    @property
+    def statistics(self):
+        if self._statistics is None:
+            if self._columns is not None:
+                self._statistics = TransactionStatistics.from_columns(self._columns)
+            else:
+                self._statistics = TransactionStatistics(self.address)
+                self._statistics.add_transactions(self._transactions)
+        return self._statistics
+
+
+    def get_statistics(self):
+        return self.statistics.get_statistics()
+
+
     def get_variance(self, token):
-        changes = list(self.get_trade_balance_changes(token))
-        try:
-            mean = sum(changes) / len(changes)
-        except ZeroDivisionError:
+        if self._columns is not None:
+            return self._columns.get_variance(token)
+        if token not in self.statistics:
             return 0
-        variance = 0
-        for change in changes:
-            variance += (change - mean) ** 2
-        variance /= len(changes)
-        return variance
+        return self.statistics[token].variance
 
 
     def get_standard_deviation(self, token):
@@ -436,18 +905,8 @@ class TransactionRange:
 
 
     def get_skew(self, token):
-        changes = list(self.get_trade_balance_changes(token))
-        sample_size = len(changes)
-        try:
-            mean = sum(changes) / sample_size
-            skew = 0
-            for change in changes:
-                skew += (change - mean) ** 3
-            sd = self.get_standard_deviation(token)
-            skew /= ((sample_size - 1) * (sd ** 3))
-            return skew
-        except ZeroDivisionError:
+        if self._columns is not None:
+            return self._columns.get_skew(token)
+        if token not in self.statistics:
             return 0
-
-
-
+        return self.statistics[token].skew
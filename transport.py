@@ -0,0 +1,226 @@
+import os
+import time
+import random
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit, parse_qs
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from requests_cache import CachedSession
+
+from config import get_data_dir
+from metrics import timer, increment
+
+
+NEVER_EXPIRE = -1
+DO_NOT_CACHE = 0
+
+# Results for timestamps or block ranges closer to the present than this
+# may still change and are never cached.
+FINALITY_SECONDS = 10 * 60
+
+
+class RateLimitError(Exception):
+    pass
+
+
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+def get_backoff(backoff_factor, attempt, retry_after=None):
+    if retry_after and retry_after.isdigit():
+        return int(retry_after)
+    return backoff_factor * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+# Retries are made here instead of by urllib3, which would re-send inside
+# HTTPAdapter.send without going back to the limiter; every attempt takes
+# its own token.
+class RateLimitedAdapter(HTTPAdapter):
+    def __init__(self, limiter=None, retries=5, backoff_factor=0.5, **kwargs):
+        self.limiter = limiter
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        super().__init__(max_retries=0, **kwargs)
+
+    def send(self, request, **kwargs):
+        for attempt in range(self.retries + 1):
+            if self.limiter:
+                self.limiter.acquire()
+            try:
+                response = super().send(request, **kwargs)
+            except (ConnectionError, Timeout):
+                if attempt == self.retries:
+                    raise
+                time.sleep(get_backoff(self.backoff_factor, attempt))
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                return response
+            retry_after = response.headers.get('Retry-After')
+            response.close()
+            time.sleep(get_backoff(self.backoff_factor, attempt, retry_after))
+
+
+class TransportSession(CachedSession):
+    def __init__(self, name, get_expire_after, limiter=None, pool_size=16, retries=5, backoff_factor=0.5,
+            filter_fn=None, get_endpoint=None):
+        self.name = name
+        self.get_endpoint = get_endpoint or (lambda url: urlsplit(url).path)
+        self._local = threading.local()
+        super().__init__(cache_name=os.path.join(get_data_dir(), f"{name}_http_cache"), backend='sqlite',
+            filter_fn=filter_fn)
+        self.get_expire_after = get_expire_after
+        adapter = RateLimitedAdapter(limiter, retries, backoff_factor, pool_connections=pool_size,
+            pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    # requests-cache keeps the per-request expiration on the session and
+    # holds a lock for the whole request while it is set, which would
+    # serialize every thread. Keeping it thread-local avoids the lock.
+    @property
+    def _request_expire_after(self):
+        return getattr(self._local, 'expire_after', None)
+
+    @_request_expire_after.setter
+    def _request_expire_after(self, expire_after):
+        self._local.expire_after = expire_after
+
+    @contextmanager
+    def request_expire_after(self, expire_after=None):
+        self._request_expire_after = expire_after
+        try:
+            yield
+        finally:
+            self._request_expire_after = None
+
+    def request(self, method, url, *args, **kwargs):
+        if kwargs.get('expire_after') is None:
+            kwargs['expire_after'] = self.get_expire_after(url)
+        endpoint = self.get_endpoint(url)
+        with timer('api_request_seconds', client=self.name, endpoint=endpoint):
+            response = super().request(method, url, *args, **kwargs)
+        cached = 'true' if getattr(response, 'from_cache', False) else 'false'
+        increment('api_requests_total', client=self.name, endpoint=endpoint, cached=cached,
+            status=response.status_code)
+        return response
+
+
+def get_query(url):
+    return dict((k, v[0]) for k, v in parse_qs(urlsplit(url).query).items())
+
+
+def is_settled(timestamp):
+    return int(timestamp) < time.time() - FINALITY_SECONDS
+
+
+def is_etherscan_rate_limited(response):
+    try:
+        result = response.json().get('result')
+    except ValueError:
+        return False
+    return isinstance(result, str) and 'rate limit' in result.lower()
+
+
+# Errors such as query timeouts or a bad key also come back as 200 responses,
+# so only successful results and genuinely empty windows are cached.
+def is_etherscan_cacheable(response):
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    if not isinstance(data, dict):
+        return False
+    return str(data.get('status')) == '1' or 'No transactions found' in str(data.get('message', ''))
+
+
+class EtherscanTransport:
+    def __init__(self, limiter=None, retries=5, backoff_factor=1.0):
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.final_block = 0
+        self.session = TransportSession('etherscan', self.get_expire_after, limiter,
+            filter_fn=is_etherscan_cacheable,
+            get_endpoint=lambda url: get_query(url).get('action', ''))
+
+    def get_expire_after(self, url):
+        query = get_query(url)
+        action = query.get('action')
+        if action == 'getblocknobytime':
+            return NEVER_EXPIRE if is_settled(query['timestamp']) else DO_NOT_CACHE
+        elif action == 'tokentx':
+            endblock = query.get('endblock', '')
+            return NEVER_EXPIRE if endblock.isdigit() and int(endblock) <= self.final_block else DO_NOT_CACHE
+        elif action == 'tokenbalance':
+            return 15
+        return 60
+
+    def track_final_block(self, url, response):
+        query = get_query(url)
+        if query.get('action') == 'getblocknobytime' and is_settled(query['timestamp']):
+            try:
+                self.final_block = max(self.final_block, int(response.json()['result']))
+            except (ValueError, KeyError, TypeError):
+                pass
+
+    # Etherscan signals throttling with a normal 200 response, so it is
+    # retried here rather than by the adapter.
+    def get(self, url, **kwargs):
+        for attempt in range(self.retries + 1):
+            response = self.session.get(url, **kwargs)
+            if not is_etherscan_rate_limited(response):
+                self.track_final_block(url, response)
+                return response
+            increment('api_rate_limited_total', client='etherscan')
+            time.sleep(get_backoff(self.backoff_factor, attempt))
+        raise RateLimitError(f"Etherscan rate limit still exceeded after {self.retries} retries")
+
+
+# The stock client builds each method around a requests.get looked up in its
+# own module. This subclass sends the same URL through the transport instead,
+# so the etherscan module and any other user of it are left alone.
+def make_etherscan_client(api_key, transport):
+    from etherscan import Etherscan
+    from etherscan.enums.fields_enum import FieldsEnum as fields
+    from etherscan.utils.parsing import ResponseParser as parser
+
+    class TransportEtherscan(Etherscan):
+        @staticmethod
+        def _Etherscan__run(func, api_key, net):
+            def wrapper(*args, **kwargs):
+                url = (f"{fields.PREFIX.format(net.lower()).replace('-main', '')}"
+                    f"{func(*args, **kwargs)}{fields.API_KEY}{api_key}")
+                return parser.parse(transport.get(url, headers={'User-Agent': ''}))
+            return wrapper
+
+    return TransportEtherscan(api_key)
+
+
+def get_coingecko_endpoint(url):
+    parts = urlsplit(url).path.split('/api/v3/')[-1].strip('/').split('/')
+    if parts[0] in ['coins', 'exchanges'] and len(parts) > 1 and parts[1] not in ['list', 'markets']:
+        parts[1] = '{id}'
+    return '/'.join(parts)
+
+
+def get_coingecko_expire_after(url, price_ttl=30, coins_list_ttl=24 * 60 * 60, exchanges_ttl=24 * 60 * 60):
+    path = urlsplit(url).path
+    if path.endswith('/simple/price'):
+        return price_ttl
+    elif path.endswith('/coins/list'):
+        return coins_list_ttl
+    elif path.endswith('/market_chart/range'):
+        return NEVER_EXPIRE if is_settled(get_query(url).get('to', 0)) else 60
+    elif '/exchanges' in path:
+        return exchanges_ttl
+    elif '/coins/' in path:
+        return 5 * 60
+    return 60
+
+
+def make_coingecko_session(limiter=None, price_ttl=30, coins_list_ttl=24 * 60 * 60,
+        exchanges_ttl=24 * 60 * 60):
+    return TransportSession('coingecko',
+        lambda url: get_coingecko_expire_after(url, price_ttl, coins_list_ttl, exchanges_ttl), limiter,
+        get_endpoint=get_coingecko_endpoint)
@@ -0,0 +1,12 @@
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def get_decimal_scale(decimals):
+    return pow(10, decimals)
+
+
+# Dividing the raw integer by an exact power of ten rounds once, unlike
+# multiplying by the inexact float 10 ** -decimals.
+def convert_token_value(value, decimal):
+    return int(value) / get_decimal_scale(int(decimal))
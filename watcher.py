@@ -1,15 +1,34 @@
+import os
+import copy
 import time
+import asyncio
+import inspect
+import threading
 
-from transactions import Transactions, TransactionRange, get_alias_address
+from transactions import Transactions, TransactionRange, get_alias_address, get_timestamp_block_number, \
+    get_address_block_transactions
+from stats import TransactionStatistics
+from metrics import metrics, profile
 from datetime import datetime
 from coingecko import *
+import coingecko
+
+
+# A star import only copies names that exist at import time, so the lazy
+# coingecko globals are looked up on the module instead.
+def __getattr__(name):
+    if name in ['api', 'main_list']:
+        return getattr(coingecko, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def print_date():
     print(datetime.fromtimestamp(time.time()))
 
 
 def format_trade(trade):
-    date = datetime.fromtimestamp(trade[0][0])
+    date = trade[0][0]
+    if not isinstance(date, str):
+        date = datetime.fromtimestamp(date)
     if len(trade) > 1:
         [l, r] = trade
         l, r = [str(_) for _ in l[1:]], [str(_) for _ in r[1:]]
@@ -39,6 +58,118 @@ def watch(address, interval=120):
         print("Stopping.")
 
 
+def print_sink(address, table, balance_changes, statistics):
+    print(f"{datetime.fromtimestamp(round(time.time()))} {address}")
+    for h in table:
+        print(format_trade(table[h]))
+    print(balance_changes)
+    print(statistics)
+
+
+# Etherscan indexes new blocks with a delay and the head may still be
+# reorged, so the watcher stays this many blocks behind it. Transfers in
+# those blocks are picked up on a later tick instead of being skipped.
+CONFIRMATIONS = 12
+
+
+class LatestBlock:
+    def __init__(self, ttl=10, confirmations=CONFIRMATIONS):
+        self.ttl = ttl
+        self.confirmations = confirmations
+        self._block = None
+        self._updated = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._block is None or time.time() - self._updated > self.ttl:
+                self._block = get_timestamp_block_number(round(time.time())) - self.confirmations
+                self._updated = time.time()
+            return self._block
+
+
+class WalletCursor:
+    def __init__(self, address, block, interval=120, min_interval=15, max_interval=600):
+        self.address = address
+        self.block = block
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.statistics = TransactionStatistics(address)
+
+    def update_interval(self, active):
+        if active:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+
+
+def poll_wallet(cursor, latest_block, profile_dir=None):
+    path = None
+    if profile_dir:
+        path = os.path.join(profile_dir, f"{cursor.address}-{time.time_ns()}.prof")
+    with metrics.timer('watcher_tick_seconds'), profile(path):
+        return _poll_wallet(cursor, latest_block)
+
+
+def _poll_wallet(cursor, latest_block):
+    endblock = latest_block.get()
+    if endblock <= cursor.block:
+        return None
+    startblock = cursor.block + 1
+    transactions = get_address_block_transactions(cursor.address, startblock, endblock)
+    if not transactions:
+        cursor.block = endblock
+        return None
+    latest = TransactionRange.from_transactions(cursor.address, transactions, startblock, endblock)
+    table, balance_changes = latest.get_trade_table(), latest.get_balance_changes(latest.token_list)
+    statistics = copy.deepcopy(cursor.statistics)
+    statistics.add_transactions(transactions)
+    result = table, balance_changes, statistics.get_statistics()
+    # The cursor only moves once the whole result is built, so a failed
+    # balance fetch retries the same blocks on the next tick.
+    cursor.block, cursor.statistics = endblock, statistics
+    return result
+
+
+async def watch_wallet(cursor, latest_block, sink, profile_dir=None, metrics_path=None):
+    while True:
+        await asyncio.sleep(cursor.interval)
+        try:
+            result = await asyncio.to_thread(poll_wallet, cursor, latest_block, profile_dir)
+        except Exception as e:
+            print(f"Failed to poll {cursor.address}: {e}")
+            metrics.increment('watcher_errors_total')
+            cursor.update_interval(False)
+            continue
+        finally:
+            if metrics_path:
+                metrics.write(metrics_path)
+        cursor.update_interval(result is not None)
+        if result is not None:
+            output = sink(cursor.address, *result)
+            if inspect.isawaitable(output):
+                await output
+
+
+async def watch_wallets(addresses, sink=print_sink, interval=120, min_interval=15, max_interval=600,
+        profile_dir=None, metrics_path=None):
+    latest_block = LatestBlock(ttl=min_interval)
+    block = await asyncio.to_thread(latest_block.get)
+    cursors = [WalletCursor(address, block, interval, min_interval, max_interval) for address in addresses]
+    await asyncio.gather(*[watch_wallet(cursor, latest_block, sink, profile_dir, metrics_path)
+        for cursor in cursors])
+
+
+def watch_all(addresses, sink=print_sink, interval=120, min_interval=15, max_interval=600,
+        profile_dir=None, metrics_path=None):
+    try:
+        asyncio.run(watch_wallets(addresses, sink, interval, min_interval, max_interval, profile_dir,
+            metrics_path))
+    except KeyboardInterrupt:
+        print("Stopping.")
+
+
 def run_trades(txs, token, interval=1):
     print(token)
     gen = txs.get_token_trades(token)